@@ -0,0 +1,229 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import graph_generators
+from csr_network import CSRNetwork
+from graph_io import edges_to_csr
+from neural_net import Network
+
+"""
+Benchmarks for the hot paths of both network backends:
+    - building the network (add_node_to_network for every node)
+    - initialise_all_node_neighbours
+    - walks per second through transition_to_neighbour
+      (and simulate_walks for the CSR backend)
+    - update_node_probabilities throughput
+    - peak memory per edge while building
+
+on construct_graph_example_2 and on graphs from graph_generators (power-law,
+Erdos-Renyi, small world and grid), over a range of sizes and out-degrees.
+Results are written as JSON so runs can be compared.
+
+Example:
+    python benchmark.py --sizes 100 10000 1000000 --degrees 2 8 --output results.json
+"""
+
+
+"""
+Edges of each kind of graph, as (sources, targets), given the number of
+nodes, out-degree and seed. example_2 and grid ignore the out-degree.
+"""
+GRAPHS = {
+    "example_2": lambda num_nodes, degree, seed: graph_generators.chain_of_k(num_nodes, 2),
+    "power_law": lambda num_nodes, degree, seed: graph_generators.power_law(
+        num_nodes, degree, seed=seed),
+    "erdos_renyi": lambda num_nodes, degree, seed: graph_generators.erdos_renyi(
+        num_nodes, degree, seed=seed),
+    "small_world": lambda num_nodes, degree, seed: graph_generators.small_world(
+        num_nodes, degree, seed=seed),
+    "grid": lambda num_nodes, degree, seed: graph_generators.grid(
+        max(int(num_nodes ** 0.5), 1), num_nodes // max(int(num_nodes ** 0.5), 1)),
+}
+
+# graphs whose out-degree is fixed, and what it is
+FIXED_DEGREES = {"example_2": 2, "grid": 4}
+
+
+"""
+{node_id: [neighbour ids]} for a graph, with repeated edges dropped.
+"""
+def make_graph(graph_name, num_nodes, degree, seed):
+
+    sources, targets = GRAPHS[graph_name](num_nodes, degree, seed)
+    indptr, indices, _ = edges_to_csr(sources, targets, num_nodes)
+    sources = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    return graph_generators.to_adjacency(sources, indices, len(indptr) - 1)
+
+
+"""
+A fresh, empty network of the given backend.
+"""
+def new_network(backend, path_length, seed):
+    if backend == "node":
+        return Network(None, training_tests=1, path_length=path_length,
+                       reinforcement=0.01, seed=seed)
+    return CSRNetwork(training_tests=1, path_length=path_length, reinforcement=0.01, seed=seed)
+
+
+"""
+Adds every node to the network and initialises neighbours, timing each half.
+"""
+def build(backend, adjacency, goal_node_id, path_length, seed):
+
+    network = new_network(backend, path_length, seed)
+    network.goal_node_id = goal_node_id
+
+    start = time.perf_counter()
+    for node_id, neighbour_ids in adjacency.items():
+        network.add_node_to_network(node_id, neighbour_ids)
+    construct_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    network.initialise_all_node_neighbours()
+    initialise_seconds = time.perf_counter() - start
+
+    return network, construct_seconds, initialise_seconds
+
+
+"""
+Peak memory (bytes) traced while building the network.
+"""
+def peak_build_memory(backend, adjacency, goal_node_id, path_length, seed):
+
+    tracemalloc.start()
+    network = build(backend, adjacency, goal_node_id, path_length, seed)[0]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del network
+    return peak
+
+
+"""
+Runs walks one at a time through transition_to_neighbour for about
+min_seconds, then reinforces all of them with update_node_probabilities.
+"""
+def time_walks_and_updates(backend, network, min_seconds):
+
+    paths = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        for _ in range(100):
+            if backend == "node":
+                paths.append(network.nodes[0].transition_to_neighbour(
+                    network.path_length, network.goal_node_id,
+                    random_stream=network.random_stream))
+            else:
+                paths.append(network.transition_to_neighbour(
+                    0, network.path_length, network.goal_node_id))
+    walk_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in paths:
+        network.update_node_probabilities(path)
+    update_seconds = time.perf_counter() - start
+
+    hops = sum(len(path) for path in paths)
+    return {
+        "walks_per_second": len(paths) / walk_seconds,
+        "hops_per_second": hops / walk_seconds,
+        "updates_per_second": hops / max(update_seconds, 1e-9),
+    }
+
+
+"""
+Walks per second through the vectorised simulate_walks (CSR backend only).
+"""
+def time_batch_walks(network, n_walks):
+
+    start = time.perf_counter()
+    network.simulate_walks(n_walks, network.path_length)
+    return n_walks / (time.perf_counter() - start)
+
+
+"""
+Runs every benchmark for one backend and graph, returning a result row.
+"""
+def run_case(backend, graph_name, num_nodes, degree, args):
+
+    adjacency = make_graph(graph_name, num_nodes, degree, args.seed)
+    num_nodes = len(adjacency)
+    num_edges = sum(len(neighbour_ids) for neighbour_ids in adjacency.values())
+    goal_node_id = num_nodes - 1
+
+    network, construct_seconds, initialise_seconds = build(
+        backend, adjacency, goal_node_id, args.path_length, args.seed)
+
+    result = {
+        "backend": backend,
+        "graph": graph_name,
+        "num_nodes": num_nodes,
+        "out_degree": FIXED_DEGREES.get(graph_name, degree),
+        "num_edges": num_edges,
+        "construct_seconds": construct_seconds,
+        "initialise_seconds": initialise_seconds,
+    }
+    result.update(time_walks_and_updates(backend, network, args.min_seconds))
+
+    if backend == "csr":
+        result["batch_walks_per_second"] = time_batch_walks(network, args.batch_walks)
+
+    del network
+    if args.memory:
+        peak = peak_build_memory(backend, adjacency, goal_node_id, args.path_length, args.seed)
+        result["peak_bytes_per_edge"] = peak / max(num_edges, 1)
+
+    return result
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Benchmark the network hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--degrees", type=int, nargs="+", default=[2, 8])
+    parser.add_argument("--graphs", nargs="+", default=["example_2", "power_law"],
+                        choices=sorted(GRAPHS))
+    parser.add_argument("--backends", nargs="+", default=["node", "csr"], choices=["node", "csr"])
+    parser.add_argument("--path-length", type=int, default=10)
+    parser.add_argument("--min-seconds", type=float, default=1.0,
+                        help="how long to keep running single walks for")
+    parser.add_argument("--batch-walks", type=int, default=100000)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the (slower) traced memory pass")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    results = []
+    for graph_name in args.graphs:
+        degrees = [FIXED_DEGREES[graph_name]] if graph_name in FIXED_DEGREES else args.degrees
+        for num_nodes in args.sizes:
+            for degree in degrees:
+                for backend in args.backends:
+                    result = run_case(backend, graph_name, num_nodes, degree, args)
+                    results.append(result)
+                    print("{graph} n={num_nodes} k={out_degree} {backend}: "
+                          "build {construct_seconds:.3f}s, init {initialise_seconds:.3f}s, "
+                          "{walks_per_second:.0f} walks/s, {updates_per_second:.0f} updates/s"
+                          .format(**result))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "results": results,
+    }
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import os
+import shutil
+import time
+
+import numpy as np
+
+from csr_network import row_edges
+from graph_io import load_mmap, save_mmap
+
+"""
+Saving learned probabilities while training, so long runs can pick up
+where they left off.
+
+A checkpoint directory holds:
+    base/              - a full copy of the network (graph_io's mmap format)
+    delta_000001.npz   - the rows of every node changed since the snapshot
+    delta_000002.npz     before it, in order
+    ...
+
+Restoring memory-maps the base (so nothing is copied until it's used) and
+then writes the deltas over it in order.
+
+Works with either a CSRNetwork or a Network. A Network's base is saved as
+its to_csr() snapshot, so restore gives back a CSRNetwork unless it's given
+a Network to load the probabilities into.
+
+Usage:
+    checkpointer = Checkpointer(network, "run_checkpoints", interval=600)
+    network.run_all_training_tests(checkpointer=checkpointer)
+
+    # after a restart
+    network = restore("run_checkpoints")
+    # or, for a Network built the same way as before
+    network = restore("run_checkpoints", network=network)
+"""
+class Checkpointer(object):
+
+    def __init__(self, network, directory, interval=300.0):
+        self.network = network  # a CSRNetwork or Network
+        self.directory = directory
+        self.interval = interval  # seconds between snapshots in tick()
+
+        # a Network is saved through its to_csr() snapshot
+        self.object_backend = hasattr(network, "to_csr")
+
+        # indptr and probability type the base was saved with (and a
+        # Network's structure_version); if the graph itself changes (nodes
+        # added) or set_precision changes the type, the next snapshot has to
+        # be a full one
+        self.base_indptr = None
+        self.base_dtype = None
+        self.base_version = None
+        self.deltas_written = 0
+        self.last_snapshot = time.monotonic()
+
+    """
+    Takes a snapshot if at least interval seconds have passed since the last.
+    Training loops call this after every step.
+    """
+    def tick(self):
+        if time.monotonic() - self.last_snapshot >= self.interval:
+            self.snapshot()
+
+    """
+    Saves the network. The first snapshot (or full=True) writes everything
+    and clears out old deltas; later ones only write the nodes that changed.
+    """
+    def snapshot(self, full=False):
+
+        self.network.initialise_all_node_neighbours()
+
+        if full or not self.base_is_current():
+            self.write_base()
+        else:
+            self.write_delta()
+
+        self.last_snapshot = time.monotonic()
+
+    """
+    Whether deltas can still be written against the saved base.
+    """
+    def base_is_current(self):
+
+        network = self.network
+        if self.base_indptr is None:
+            return False
+        if self.object_backend:
+            return self.base_version == network.structure_version
+        return self.base_indptr is network.indptr \
+            and self.base_dtype == network.probs.dtype
+
+    """
+    Writes a full copy of the network as the new base.
+    """
+    def write_base(self):
+
+        network = self.network
+        os.makedirs(self.directory, exist_ok=True)
+
+        # start tracking before saving, so nothing changed after is missed
+        network.track_changes()
+
+        saved = network.to_csr() if self.object_backend else network
+
+        new_base = os.path.join(self.directory, "base.new")
+        base = os.path.join(self.directory, "base")
+        shutil.rmtree(new_base, ignore_errors=True)
+        save_mmap(saved, new_base)
+
+        # old deltas belong to the old base
+        for name in delta_files(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        shutil.rmtree(base, ignore_errors=True)
+        os.rename(new_base, base)
+
+        self.base_indptr = saved.indptr
+        self.base_dtype = saved.probs.dtype
+        if self.object_backend:
+            self.base_version = network.structure_version
+        self.deltas_written = 0
+
+    """
+    Writes the rows of the nodes that changed since the last snapshot.
+    """
+    def write_delta(self):
+
+        network = self.network
+        changed = network.track_changes()
+        if len(changed) == 0:
+            return
+
+        if self.object_backend:
+            # same order as to_csr, which the base was saved with
+            probs = np.array([probability for node_id in changed.tolist()
+                              for probability in network.nodes[node_id].edges.values()],
+                             dtype=self.base_dtype)
+        else:
+            positions, _ = row_edges(network.indptr, changed)
+            probs = network.probs[positions]
+
+        self.deltas_written += 1
+        name = "delta_{:06d}.npz".format(self.deltas_written)
+        temporary = os.path.join(self.directory, name + ".tmp")
+
+        # write then rename, so a half-written delta is never picked up
+        with open(temporary, 'wb') as delta_file:
+            np.savez(delta_file, nodes=changed, probs=probs)
+        os.replace(temporary, os.path.join(self.directory, name))
+
+
+"""
+Names of the delta files in a checkpoint directory, oldest first.
+"""
+def delta_files(directory):
+    return sorted(name for name in os.listdir(directory)
+                  if name.startswith("delta_") and name.endswith(".npz"))
+
+
+"""
+Rebuilds the network from a checkpoint directory: the base is memory-mapped
+with numpy mmap_mode (default "c", so the files are left alone) and the
+deltas are applied on top.
+Returns a CSRNetwork, or if a Network is passed in, loads the probabilities
+into it (see Network.load_probabilities) and returns that instead.
+"""
+def restore(directory, mode="c", network=None):
+
+    # if we stopped part way through replacing the base, a finished new base
+    # (settings.json is written last) is newer than anything else there
+    new_base = os.path.join(directory, "base.new")
+    if os.path.exists(os.path.join(new_base, "settings.json")):
+        restored = load_mmap(new_base, mode=mode)
+    else:
+        restored = load_mmap(os.path.join(directory, "base"), mode=mode)
+
+        for name in delta_files(directory):
+            with np.load(os.path.join(directory, name)) as delta:
+                nodes = delta["nodes"]
+                positions, _ = row_edges(restored.indptr, nodes)
+                restored.probs[positions] = delta["probs"]
+                restored.refresh_cutoffs(nodes)
+
+    if network is None:
+        return restored
+
+    network.load_probabilities(restored)
+    return network
+
+
+"""
+Saves a one-off full checkpoint of a Network or CSRNetwork.
+"""
+def save(network, directory):
+    Checkpointer(network, directory).snapshot(full=True)
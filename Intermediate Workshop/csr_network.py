@@ -0,0 +1,1329 @@
+import logging
+from bisect import bisect_left
+from functools import lru_cache
+
+import numpy as np
+from numpy import random
+
+from random_streams import RandomStream
+from walk_result import WalkResult
+
+# child of the neural_net logger, so neural_net.set_verbosity covers it too
+logger = logging.getLogger("neural_net.csr_network")
+
+# distance given to nodes that can't reach the goal at all
+UNREACHABLE = np.iinfo(np.int32).max
+
+# a row whose probabilities add up to within this of 1 is treated as adding
+# up to exactly 1: its last cutoff is set to 1, so every random number in
+# [0, 1) picks an edge instead of falling past the end through rounding
+ROW_SUM_TOLERANCE = 1e-9
+
+# probability types set_precision accepts
+PRECISIONS = (np.float16, np.float32, np.float64)
+
+# rows with at most this many edges are updated with a plain Python loop,
+# which beats NumPy's per-call overhead on so few numbers
+SMALL_ROW = 8
+
+"""
+Array-backed version of the Network, for very large graphs.
+
+Instead of a Node object per node (each with an edges dictionary and a
+neighbours dictionary), the whole graph is stored as three flat NumPy arrays
+in compressed sparse row (CSR) form:
+
+    indptr:  edges of node i live at positions indptr[i] <-> indptr[i + 1]
+    indices: neighbour id of each edge
+    probs:   transition probability of each edge
+
+So node 0 in construct_graph_example_1 ([1, 3] with 0.5 each) looks like:
+    indptr = [0, 2, ...], indices = [1, 3, ...], probs = [0.5, 0.5, ...]
+
+Node ids are used directly as row numbers, so they must be integers >= 0.
+Ids that were never added (or only appear as a neighbour) are sink nodes.
+
+seed fixes the network's random numbers, so the same seed gives the same
+paths and learned probabilities every run.
+
+normalise_rows keeps every row adding up to 1, the same as for Network. The
+samplers rely on it: with it on, a walk always picks one of the row's edges.
+"""
+class CSRNetwork(object):
+
+    def __init__(self, training_tests, path_length, reinforcement, seed=None,
+                 normalise_rows=False):
+        self.goal_node_id = 0  # the node we want to reach
+
+        # where all of the network's random numbers come from
+        self.random_stream = RandomStream(seed)
+
+        # end walks early once they can no longer reach the goal in time
+        self.prune_hopeless_walks = False
+        # keep every row adding up to 1, see normalise_rows
+        self._normalise_rows = normalise_rows
+        # (goal id, indptr, distances) from the last goal_distances call
+        self.goal_index = None
+
+        # Parameters for training tests:
+        self.training_tests = training_tests
+        self.path_length = path_length
+        self.reinforcement = reinforcement
+
+        # The graph itself, in CSR form (starts off with no nodes)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.probs = np.zeros(0, dtype=np.float64)
+
+        # running total of probs along each row, the upper bound of each
+        # edge's (lower, upper] choice range. Kept in step with probs.
+        self.cutoffs = np.zeros(0, dtype=np.float64)
+
+        # nodes added since the arrays were last built {node_id: neighbour_ids}
+        self.pending_nodes = {}
+
+        # sorted (node, neighbour) keys for finding edges, built when needed
+        self.edge_lookup = None
+
+        # which nodes' probabilities have changed, only kept once
+        # track_changes is called (e.g. for incremental checkpoints)
+        self.changed_nodes = None
+
+        # epochs in a row each edge has been below prune_weak_edges' epsilon,
+        # only kept once prune_weak_edges is called
+        self.low_epochs = None
+        # edges removed by pruning so far, and the most a step of a walk can
+        # have changed because of it (see prune_weak_edges)
+        self.edges_pruned = 0
+        self.pruned_share = 0.0
+
+        # a metrics.TrainingMetrics to count and time training, or None
+        self.metrics = None
+
+    """
+    Whether every row is kept adding up to 1. Turning it on rescales every
+    row straight away.
+    """
+    @property
+    def normalise_rows(self):
+        return self._normalise_rows
+
+    @normalise_rows.setter
+    def normalise_rows(self, normalise_rows):
+        self._normalise_rows = normalise_rows
+        if normalise_rows:
+            self.normalise()
+
+    """
+    Rescales every row to add up to 1 (rows that are all 0 are left alone)
+    and rebuilds the cutoffs.
+    """
+    def normalise(self):
+
+        rows = np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+        totals = np.bincount(rows, weights=self.probs, minlength=self.num_nodes)
+        self.probs[:] = self.probs / np.where(totals > 0, totals, 1)[rows]
+        self.cutoffs[:] = row_cumsum(self.indptr, self.probs)
+
+        if self.changed_nodes is not None:
+            self.changed_nodes[:] = True
+
+    """
+    Builds a network straight from existing CSR arrays, e.g. a snapshot of a
+    trained Network. The arrays are used as they are, not copied. cutoffs are
+    worked out from probs unless they're given too.
+    """
+    @classmethod
+    def from_arrays(cls, indptr, indices, probs, training_tests, path_length, reinforcement,
+                    cutoffs=None, seed=None):
+
+        network = cls(training_tests, path_length, reinforcement, seed)
+        network.set_arrays(indptr, indices, probs, cutoffs)
+
+        return network
+
+    """
+    Replaces the whole graph with the given CSR arrays (used as they are, not
+    copied), dropping any nodes still waiting to be added.
+    """
+    def set_arrays(self, indptr, indices, probs, cutoffs=None):
+
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices)
+        self.probs = np.asarray(probs)
+        if cutoffs is None:
+            cutoffs = row_cumsum(self.indptr, self.probs).astype(self.probs.dtype, copy=False)
+        self.cutoffs = np.asarray(cutoffs)
+
+        self.pending_nodes = {}
+        self.edge_lookup = None
+        self.goal_index = None
+        self.low_epochs = None
+        if self.changed_nodes is not None:
+            self.changed_nodes = np.ones(self.num_nodes, dtype=bool)
+
+        if self.normalise_rows:
+            self.normalise()
+
+    """
+    Number of nodes (rows) currently stored in the arrays.
+    """
+    @property
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    """
+    Adds a node and its outgoing edges to the network. All probabilities
+    start equal, same as Node.initialise_edges.
+
+    Nodes are staged and only packed into the arrays when
+    initialise_all_node_neighbours is called, so adding nodes one at a time
+    stays cheap. Adding an id that already exists replaces its edges.
+    """
+    def add_node_to_network(self, node_id, neighbour_ids: list):
+
+        if node_id < 0:
+            raise ValueError("Node ids must be non-negative integers, got {}".format(node_id))
+
+        self.pending_nodes[node_id] = list(neighbour_ids)
+
+    """
+    Packs all staged nodes into the CSR arrays. Named to match
+    Network.initialise_all_node_neighbours so the same driver code works
+    with both backends. Safe to call again after adding more nodes.
+    """
+    def initialise_all_node_neighbours(self):
+
+        if not self.pending_nodes:
+            return
+
+        # work out how many rows we need (neighbour-only ids become sinks)
+        num_nodes = self.num_nodes
+        for node_id, neighbour_ids in self.pending_nodes.items():
+            num_nodes = max(num_nodes, node_id + 1, max(neighbour_ids, default=-1) + 1)
+
+        # rows from the pending nodes, de-duplicated like a dictionary would
+        new_rows = {}
+        for node_id, neighbour_ids in self.pending_nodes.items():
+            if len(neighbour_ids) == 0:
+                new_rows[node_id] = ([], [])
+                continue
+            initial_probability = 1.0 / len(neighbour_ids)
+            unique_ids = list(dict.fromkeys(neighbour_ids))
+            new_rows[node_id] = (unique_ids, [initial_probability] * len(unique_ids))
+
+        # degree of every row, old rows kept unless they were replaced
+        old_degrees = np.diff(self.indptr)
+        degrees = np.zeros(num_nodes, dtype=np.int64)
+        degrees[:len(old_degrees)] = old_degrees
+        replaced = np.zeros(num_nodes, dtype=bool)
+        for node_id, (neighbour_ids, _) in new_rows.items():
+            degrees[node_id] = len(neighbour_ids)
+            replaced[node_id] = True
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        indices = np.empty(indptr[-1], dtype=self._index_dtype(num_nodes))
+        probs = np.empty(indptr[-1], dtype=self.probs.dtype)
+
+        # copy across the old edges that are being kept, all in one go
+        old_rows = np.repeat(np.arange(len(old_degrees)), old_degrees)
+        keep = ~replaced[old_rows]
+        kept_rows = old_rows[keep]
+        offset_in_row = np.arange(len(old_rows)) - self.indptr[old_rows]
+        destination = indptr[kept_rows] + offset_in_row[keep]
+        indices[destination] = self.indices[keep]
+        probs[destination] = self.probs[keep]
+
+        # then write in the new rows
+        for node_id, (neighbour_ids, probabilities) in new_rows.items():
+            start = indptr[node_id]
+            indices[start:start + len(neighbour_ids)] = neighbour_ids
+            probs[start:start + len(neighbour_ids)] = probabilities
+
+        self.indptr, self.indices, self.probs = indptr, indices, probs
+        self.cutoffs = row_cumsum(indptr, probs).astype(probs.dtype, copy=False)
+        self.pending_nodes = {}
+        self.edge_lookup = None
+        self.goal_index = None
+        self.low_epochs = None
+        if self.changed_nodes is not None:
+            # everything may have moved, so count every node as changed
+            self.changed_nodes = np.ones(num_nodes, dtype=bool)
+
+        if self.normalise_rows:
+            # repeated neighbour ids leave the starting probabilities short of 1
+            self.normalise()
+
+    """
+    Smallest integer type that can hold every node id.
+    """
+    @staticmethod
+    def _index_dtype(num_nodes):
+        if num_nodes <= np.iinfo(np.int32).max:
+            return np.int32
+        return np.int64
+
+    """
+    Returns (neighbour ids, probabilities) for a node, as views into the arrays.
+    """
+    def get_row(self, node_id):
+        start, end = self.indptr[node_id], self.indptr[node_id + 1]
+        return self.indices[start:end], self.probs[start:end]
+
+    """
+    Returns the edges of a node as [(node_id, neighbour_id), ...], like Node.get_edges.
+    """
+    def get_edges(self, node_id):
+        neighbour_ids, _ = self.get_row(node_id)
+        return [(node_id, int(neighbour_id)) for neighbour_id in neighbour_ids]
+
+    """
+    Generates a random float between 0 and 1 and picks the edge whose range
+    (lower, upper] contains it, same as Node.make_choice. Returns None if the
+    number falls past the end of the ranges, which can't happen with
+    normalise_rows on.
+    """
+    def make_choice(self, node_id):
+        random_num = self.random_stream.next()
+        start, end = self.indptr.item(node_id), self.indptr.item(node_id + 1)
+
+        # binary search of the cached cutoffs on this row
+        if self.normalise_rows:
+            # the row adds up to 1, so the number always lands on an edge
+            return self.indices.item(bisect_left(self.cutoffs, random_num, start, end - 1))
+        choice = bisect_left(self.cutoffs, random_num, start, end)
+
+        # if an error occurs
+        if choice == end:
+            return None
+        return self.indices.item(choice)
+
+    """
+    Number of steps from every node to the goal (UNREACHABLE if it can't get
+    there), worked out with a breadth-first search backwards from the goal.
+    Kept until the goal or the graph changes.
+    """
+    def goal_distances(self, goal_node_id=None):
+
+        if goal_node_id is None:
+            goal_node_id = self.goal_node_id
+
+        self.initialise_all_node_neighbours()
+        if self.goal_index is None or self.goal_index[0] != goal_node_id \
+                or self.goal_index[1] is not self.indptr:
+            distances = goal_distances(self.indptr, self.indices, goal_node_id)
+            self.goal_index = (goal_node_id, self.indptr, distances)
+
+        return self.goal_index[2]
+
+    """
+    Travels between nodes starting at node_id and tracks the path taken, as a
+    list of (current_node, next_node). Same stopping rules as
+    Node.transition_to_neighbour, but done with a loop instead of recursion.
+    With prune_hopeless_walks on, the walk also stops as soon as the goal is
+    further away than the moves left.
+    """
+    def transition_to_neighbour(self, node_id, limit, goal_node_id):
+        return self.walk(node_id, limit, goal_node_id).path
+
+    """
+    Same walk as transition_to_neighbour, but returns a WalkResult that also
+    has the set of nodes visited, whether the goal was reached and why the
+    walk ended, all recorded on the way.
+    """
+    def walk(self, node_id, limit, goal_node_id):
+
+        path = []
+        visited = set()
+        start_node_id = node_id
+        distances = self.goal_distances(goal_node_id) if self.prune_hopeless_walks else None
+        indptr = self.indptr
+        num_nodes = len(indptr) - 1
+
+        while True:
+            if node_id == goal_node_id:
+                ended = WalkResult.GOAL
+                break
+            if limit < 1:
+                ended = WalkResult.OUT_OF_MOVES
+                break
+
+            # end if there is nowhere to go to
+            if node_id >= num_nodes or indptr.item(node_id) == indptr.item(node_id + 1):
+                ended = WalkResult.NO_NEIGHBOURS
+                break
+
+            # end if the goal can't be reached in time
+            if distances is not None and distances[node_id] > limit:
+                ended = WalkResult.HOPELESS
+                break
+
+            next_node_id = self.make_choice(node_id)
+            if next_node_id is None:
+                # probabilities on this row no longer add up to 1
+                ended = WalkResult.STUCK
+                break
+
+            path.append((node_id, next_node_id))
+            visited.add(next_node_id)
+            node_id = next_node_id
+            limit -= 1
+
+        if path:
+            visited.add(start_node_id)
+        return WalkResult(path, visited, ended)
+
+    """
+    Same walk as transition_to_neighbour, but writes the ids of the nodes
+    visited into a preallocated buffer of size limit + 1 rather than building
+    a list. buffer[0] is the starting node. Returns the number of
+    transitions made, so the path is buffer[:count + 1].
+    """
+    def transition_into(self, node_id, buffer, limit, goal_node_id):
+
+        if len(buffer) < limit + 1:
+            raise ValueError("Buffer needs room for {} node ids".format(limit + 1))
+
+        buffer[0] = node_id
+        count = 0
+        distances = self.goal_distances(goal_node_id) if self.prune_hopeless_walks else None
+        indptr = self.indptr
+        num_nodes = len(indptr) - 1
+
+        while count < limit and node_id != goal_node_id:
+
+            if node_id >= num_nodes or indptr.item(node_id) == indptr.item(node_id + 1):
+                break
+
+            if distances is not None and distances[node_id] > limit - count:
+                break
+
+            next_node_id = self.make_choice(node_id)
+            if next_node_id is None:
+                break
+
+            node_id = next_node_id
+            count += 1
+            buffer[count] = node_id
+
+        return count
+
+    """
+    Positively or negatively reinforces the edge node_id -> neighbour_id, same
+    rule as Node.update_probabilities: the edge gets the change, every other
+    edge on the row gets the opposite change split evenly, then everything is
+    kept between 0 and 1. With normalise_rows on, the row is then rescaled to
+    add up to 1 again, so the walk can never fall past the end of the row.
+    """
+    def update_probabilities(self, node_id, neighbour_id, change):
+
+        start, end = self.indptr.item(node_id), self.indptr.item(node_id + 1)
+
+        # if no more than 1 edge, do nothing
+        if end - start < 2:
+            return
+
+        # change for each other node
+        proportional_change = change / (end - start - 1)
+
+        if end - start <= SMALL_ROW:
+            self._update_small_row(start, end, neighbour_id, change, proportional_change)
+            if self.changed_nodes is not None:
+                self.changed_nodes[node_id] = True
+            return
+
+        # worked out in float64 whatever the probabilities are stored as, so
+        # rounding only happens once, when the row is stored again
+        row = self.probs[start:end].astype(np.float64)
+        chosen = self.indices[start:end] == neighbour_id
+        row += np.where(chosen, change, -proportional_change)
+
+        # Ensure probabilities remain between desired values.
+        np.clip(row, 0, 1, out=row)
+
+        if self.normalise_rows:
+            total = row.sum()
+            if total > 0:
+                row /= total
+        self.probs[start:end] = row
+
+        # only this row's choice ranges have changed
+        cutoffs = np.cumsum(row)
+        if cutoffs[-1] < 1 and cutoffs[-1] >= 1 - row_sum_tolerance(self.cutoffs.dtype):
+            cutoffs[-1] = 1.0
+        self.cutoffs[start:end] = cutoffs
+
+        if self.changed_nodes is not None:
+            self.changed_nodes[node_id] = True
+
+    """
+    update_probabilities for a row of only a few edges, the same steps done
+    one number at a time.
+    """
+    def _update_small_row(self, start, end, neighbour_id, change, proportional_change):
+
+        probs, cutoffs = self.probs, self.cutoffs
+
+        row = probs[start:end].tolist()
+        for i, edge_neighbour_id in enumerate(self.indices[start:end].tolist()):
+            probability = row[i] + (change if edge_neighbour_id == neighbour_id
+                                    else -proportional_change)
+
+            # Ensure probabilities remain between desired values.
+            if probability < 0:
+                probability = 0.0
+            elif probability > 1:
+                probability = 1.0
+            row[i] = probability
+
+        if self.normalise_rows:
+            total = sum(row)
+            if total > 0:
+                row = [probability / total for probability in row]
+
+        # write back one number at a time, quicker than a slice for so few
+        cutoff = 0.0
+        for position, probability in zip(range(start, end), row):
+            cutoff += probability
+            probs[position] = probability
+            cutoffs[position] = cutoff
+
+        if cutoff < 1 and cutoff >= 1 - row_sum_tolerance(cutoffs.dtype):
+            cutoffs[end - 1] = 1.0
+
+    """
+    Given a path taken through the network, will either reduce or increase all
+    edge probabilities on that path, depending on whether it reached the goal.
+    reached_goal can be passed in if it's already known (e.g. from walk),
+    otherwise the path is checked for the goal.
+    """
+    def update_node_probabilities(self, path, reached_goal=None):
+
+        reinforcement = self.reinforcement
+
+        if reached_goal is None:
+            reached_goal = any(self.goal_node_id in transition for transition in path)
+
+        # Check if goal reached (for positive reinforcement)
+        if reached_goal:
+            logger.info("Positive reinforcement!")
+        else:
+            logger.info("Negative reinforcement!")
+            reinforcement = -reinforcement
+
+        for node_id, neighbour_id in path:
+            self.update_probabilities(node_id, neighbour_id, reinforcement)
+
+    """
+    Reinforces a whole batch of walks at once. walks is an int array like the
+    one from simulate_walks (node ids, -1 once a walk has ended). goal_reached
+    says which walks get positive reinforcement; by default it's every walk
+    that visited the goal, same as update_node_probabilities.
+
+    ordering decides how updates to the same node are combined:
+        "sequential" - exactly the same result as calling
+                       update_node_probabilities on each walk in turn (walk 0
+                       first, and each walk's transitions in order). Updates to
+                       different nodes don't affect each other, so every node's
+                       1st update is applied together, then every 2nd, etc.
+        "accumulate" - adds up all of the changes for each node and applies
+                       them in one go, clamping to [0, 1] only once at the
+                       end. Same as "sequential" unless a probability would
+                       have been clamped part way through; much faster when
+                       many walks go through the same nodes.
+
+    edges, the edge positions simulate_walks returns with return_edges, saves
+    looking every transition's edge up again.
+    """
+    def update_from_walks(self, walks, goal_reached=None, ordering="sequential", edges=None):
+
+        walks = np.asarray(walks)
+        if goal_reached is None:
+            goal_reached = (walks == self.goal_node_id).any(axis=1)
+
+        sources, targets, changes, edges = walk_transitions(self.indptr, walks, goal_reached,
+                                                            self.reinforcement, edges)
+        if edges is None:
+            edges = self.find_edges(sources, targets)
+
+        if ordering == "sequential":
+            self._apply_in_order(sources, edges, changes)
+        elif ordering == "accumulate":
+            self._apply_accumulated(sources, edges, changes)
+        else:
+            raise ValueError("Unknown ordering: {}".format(ordering))
+
+    """
+    Position of each (node_id, neighbour_id) edge in the arrays, or -1 if
+    there is no such edge. Works on whole arrays of ids at once.
+    """
+    def find_edges(self, node_ids, neighbour_ids):
+
+        num_nodes = self.num_nodes
+        if self.edge_lookup is None:
+            rows = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(self.indptr))
+            keys = rows * num_nodes + self.indices
+            order = np.argsort(keys, kind='stable')
+            self.edge_lookup = (keys[order], order)
+
+        sorted_keys, order = self.edge_lookup
+        wanted = np.asarray(node_ids, dtype=np.int64) * num_nodes + np.asarray(neighbour_ids)
+        positions = np.minimum(np.searchsorted(sorted_keys, wanted), max(len(sorted_keys) - 1, 0))
+
+        found = np.zeros(len(wanted), dtype=bool)
+        if len(sorted_keys):
+            found = sorted_keys[positions] == wanted
+        return np.where(found, order[positions], -1)
+
+    """
+    "sequential" ordering of update_from_walks. Groups the updates by node
+    (keeping their order), then applies every node's n-th update together.
+    """
+    def _apply_in_order(self, sources, edges, changes):
+
+        order = np.argsort(sources, kind='stable')
+        sources, edges, changes = sources[order], edges[order], changes[order]
+
+        # how many updates came before this one on the same node
+        first_of_node = np.r_[True, sources[1:] != sources[:-1]]
+        group_start = np.maximum.accumulate(np.where(first_of_node, np.arange(len(sources)), 0))
+        update_number = np.arange(len(sources)) - group_start
+
+        # sort once more by update number (stable, so nodes stay in order),
+        # making every round one contiguous slice
+        order = np.argsort(update_number, kind='stable')
+        sources, edges, changes = sources[order], edges[order], changes[order]
+        bounds = np.r_[0, np.flatnonzero(np.diff(update_number[order])) + 1, len(sources)]
+
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            self._apply_row_changes(sources[start:end], edges[start:end], changes[start:end])
+
+        self.refresh_cutoffs(np.unique(sources))
+
+    """
+    "accumulate" ordering of update_from_walks. Adding up the per-edge rule
+    for every update on a node gives, for an edge that was chosen c times
+    (total change) out of a node total of T:  c * k / (k - 1) - T / (k - 1)
+    """
+    def _apply_accumulated(self, sources, edges, changes):
+
+        touched, node_totals = np.unique(sources, return_inverse=True)
+        node_totals = np.bincount(node_totals, weights=changes, minlength=len(touched))
+
+        chosen = edges >= 0
+        edge_totals = np.bincount(edges[chosen], weights=changes[chosen], minlength=len(self.probs))
+
+        self.apply_totals(touched, node_totals, edge_totals)
+
+    """
+    Applies changes already added up the "accumulate" way: touched is the
+    sorted ids of the nodes changed, node_totals the total change on each of
+    them, and edge_totals the total change on every edge (one per edge in
+    the arrays). Used by update_from_walks, and by ParallelTrainer to apply
+    totals its workers added up.
+    """
+    def apply_totals(self, touched, node_totals, edge_totals):
+
+        positions, rows = row_edges(self.indptr, touched)
+        k = (self.indptr[touched + 1] - self.indptr[touched])[rows]
+        row = self.probs[positions] + (edge_totals[positions] * k - node_totals[rows]) / (k - 1)
+
+        # Ensure probabilities remain between desired values.
+        self.probs[positions] = self._normalised(np.clip(row, 0, 1), rows, len(touched))
+        self.refresh_cutoffs(touched)
+
+    """
+    One update each on a set of different nodes: the chosen edge (-1 for
+    none) gets the change and the others on the row lose change / (k - 1).
+    """
+    def _apply_row_changes(self, nodes, edges, changes):
+
+        positions, rows = row_edges(self.indptr, nodes)
+        k = self.indptr[nodes + 1] - self.indptr[nodes]
+        proportional_change = (changes / (k - 1))[rows]
+
+        chosen = positions == edges[rows]
+        row = self.probs[positions]
+        row += np.where(chosen, changes[rows], -proportional_change)
+
+        # Ensure probabilities remain between desired values.
+        self.probs[positions] = self._normalised(np.clip(row, 0, 1), rows, len(nodes))
+
+    """
+    With normalise_rows on, rescales the updated edges of each row (rows
+    says which row each edge belongs to) to add up to 1. Otherwise returns
+    them as they are.
+    """
+    def _normalised(self, probabilities, rows, num_rows):
+
+        if not self.normalise_rows:
+            return probabilities
+
+        totals = np.bincount(rows, weights=probabilities, minlength=num_rows)
+        return probabilities / np.where(totals > 0, totals, 1)[rows]
+
+    """
+    Rebuilds the choice cutoffs for just the given nodes.
+    """
+    def refresh_cutoffs(self, nodes):
+
+        positions, _ = row_edges(self.indptr, nodes)
+        lengths = self.indptr[nodes + 1] - self.indptr[nodes]
+        local_indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=local_indptr[1:])
+
+        self.cutoffs[positions] = row_cumsum(local_indptr, self.probs[positions])
+
+        if self.changed_nodes is not None:
+            self.changed_nodes[nodes] = True
+
+    """
+    Starts (or restarts) remembering which nodes have had their
+    probabilities changed. Returns the ids changed since the last call.
+    """
+    def track_changes(self):
+
+        changed = np.zeros(0, dtype=np.int64)
+        if self.changed_nodes is not None:
+            changed = np.flatnonzero(self.changed_nodes)
+
+        self.changed_nodes = np.zeros(self.num_nodes, dtype=bool)
+        return changed
+
+    """
+    Returns the node ids of all nodes on the given path.
+    """
+    def get_visited_nodes(self, path):
+
+        visited_node_ids = []
+        for edge in path:
+            for id in edge:
+                visited_node_ids.append(id)
+
+        return list(dict.fromkeys(visited_node_ids))
+
+    """
+    Simulates n_walks walks at once, all starting from start_node_id (a single
+    id, or one id per walk). Returns an int array of shape
+    (n_walks, path_length + 1): column 0 is the start node and column t is the
+    node reached after t transitions, with -1 once a walk has ended.
+    Random numbers come from the network's own stream unless another rng
+    (a RandomStream or numpy Generator) is given.
+    With return_outcomes, returns (walks, lengths, goal_reached) instead,
+    see the simulate_walks function.
+    """
+    def simulate_walks(self, n_walks, path_length, start_node_id=0, rng=None,
+                       return_outcomes=False):
+
+        self.initialise_all_node_neighbours()
+
+        starts = np.broadcast_to(np.asarray(start_node_id, dtype=np.int64), (n_walks,))
+        if len(starts) and (starts.min() < 0 or starts.max() >= self.num_nodes):
+            raise ValueError("Walks must start from a node in the network")
+
+        distances = self.goal_distances() if self.prune_hopeless_walks else None
+        if rng is None:
+            rng = self.random_stream
+
+        return simulate_walks(self.indptr, self.indices, self.cutoffs,
+                              starts, path_length, self.goal_node_id, rng, distances,
+                              return_outcomes=return_outcomes,
+                              normalised=self.normalise_rows)
+
+    """
+    Chance of each edge actually being picked by make_choice. This is just
+    probs when a row adds up to 1, but a clamped row may not: ranges past 1
+    are never reached and anything short of 1 means the walk stops.
+    """
+    def effective_probabilities(self):
+
+        upper = np.clip(self.cutoffs, 0, 1)
+        lower = np.clip(self.cutoffs - self.probs, 0, 1)
+        return upper - lower
+
+    """
+    Exact chance of a walk from each node reaching the goal within
+    path_length transitions (defaults to self.path_length), using the current
+    probabilities. Index the result by starting node, e.g. [0] for node 0.
+
+    Treats the probabilities as a Markov chain where the goal is never left:
+    after t steps, the chance from node u is the sum over its edges of
+    (chance of taking the edge) * (chance from the neighbour after t - 1 steps).
+    Each step is one pass over the edges, so no walks need to be simulated.
+    """
+    def goal_hit_probabilities(self, path_length=None, goal_node_id=None):
+
+        if path_length is None:
+            path_length = self.path_length
+        if goal_node_id is None:
+            goal_node_id = self.goal_node_id
+
+        self.initialise_all_node_neighbours()
+        num_nodes = self.num_nodes
+        rows = np.repeat(np.arange(num_nodes), np.diff(self.indptr))
+        edge_probabilities = self.effective_probabilities()
+
+        hit = np.zeros(num_nodes, dtype=np.float64)
+        if not 0 <= goal_node_id < num_nodes:
+            return hit
+        hit[goal_node_id] = 1.0
+
+        for _ in range(path_length):
+            hit = np.bincount(rows, weights=edge_probabilities * hit[self.indices],
+                              minlength=num_nodes)
+            hit[goal_node_id] = 1.0
+
+        return hit
+
+    """
+    Runs all training tests without any plotting. If a checkpoint.Checkpointer
+    is given, it gets the chance to save a snapshot after every test.
+    If self.metrics is set, every test is counted and timed, and the whole
+    run is one epoch.
+    """
+    def run_all_training_tests(self, starting_node_id=0, checkpointer=None):
+
+        metrics = self.metrics
+
+        i = 0
+        while i < self.training_tests:
+
+            if metrics is not None:
+                clock = metrics.clock()
+
+            walk = self.walk(starting_node_id,
+                             limit=self.path_length,
+                             goal_node_id=self.goal_node_id)
+            path = walk.path
+            logger.info("Path: %s", path)
+
+            if metrics is not None:
+                clock = metrics.lap("sampling", clock, "transition_to_neighbour")
+
+            self.update_node_probabilities(path, walk.reached_goal)
+
+            if metrics is not None:
+                metrics.lap("updating", clock, "update_node_probabilities")
+                metrics.record_walk(len(path), walk.reached_goal)
+
+            if checkpointer is not None:
+                checkpointer.tick()
+
+            i += 1
+
+        if metrics is not None:
+            metrics.end_epoch()
+
+    """
+    Read-only copy of the trained network for answering "where next?" and
+    "most likely path" queries, see inference.FrozenPolicy.
+    """
+    def freeze(self, cache_size=4096):
+        from inference import FrozenPolicy
+        return FrozenPolicy.from_network(self, cache_size)
+
+    """
+    Approximate memory used by the graph arrays, in bytes per edge.
+    """
+    def bytes_per_edge(self):
+        total = self.indptr.nbytes + self.indices.nbytes + self.probs.nbytes
+        return total / max(len(self.indices), 1)
+
+    """
+    Stores the probabilities (and cutoffs) as dtype from now on: np.float32
+    halves their memory and np.float16 quarters it, at the cost of rounding
+    every probability to about 7 or 3 significant figures. Returns the
+    largest change the conversion made to any probability.
+
+    Below float64 this also turns normalise_rows on. Updates are still
+    worked out in float64, but storing each result rounds it again, and
+    without rescaling the rows would drift further from adding up to 1 with
+    every update. storage_report's row_sum_error shows how close they are.
+    Building a new graph (e.g. construct_graph_example_2) goes back to the
+    type of the arrays it's given, so call this afterwards.
+    """
+    def set_precision(self, dtype):
+
+        dtype = np.dtype(dtype)
+        if dtype not in PRECISIONS:
+            raise ValueError("Probabilities can be stored as float16, float32 or float64, "
+                             "not {}".format(dtype))
+
+        self.initialise_all_node_neighbours()
+        probs = self.probs.astype(dtype)
+        error = float(np.abs(probs.astype(np.float64) - self.probs).max(initial=0.0))
+
+        self.probs = probs
+        self.cutoffs = row_cumsum(self.indptr, probs).astype(dtype)
+        if self.changed_nodes is not None:
+            self.changed_nodes[:] = True
+
+        if dtype != np.float64:
+            self.normalise_rows = True
+
+        return error
+
+    """
+    Removes edges that have had a probability below epsilon for epochs calls
+    in a row, so they stop taking up memory and sampling time. Call it once
+    per epoch (e.g. after each run_all_training_tests). The most likely edge
+    on each row is always kept, so no node loses all of its edges.
+    Returns the number of edges removed.
+
+    Whatever probability the removed edges had is shared out over the rest of
+    the row in proportion, so the row adds up to the same as before. Each
+    step of a walk then differs from the unpruned network by at most the
+    share of the row that was removed, so a walk's chance of reaching the
+    goal changes by at most path_length times that. The running total of the
+    largest share removed is kept in pruned_share (see storage_report).
+    """
+    def prune_weak_edges(self, epsilon, epochs=1):
+
+        if not 1 <= epochs <= 255:
+            raise ValueError("epochs must be between 1 and 255, got {}".format(epochs))
+
+        self.initialise_all_node_neighbours()
+        if self.low_epochs is None:
+            self.low_epochs = np.zeros(len(self.probs), dtype=np.uint8)
+
+        weak = self.probs < epsilon
+        self.low_epochs[~weak] = 0
+        self.low_epochs[weak] = np.minimum(self.low_epochs[weak], 254) + 1
+        remove = self.low_epochs >= epochs
+
+        # keep the most likely edge (or edges, if tied) on every row
+        degrees = np.diff(self.indptr)
+        rows = np.repeat(np.arange(self.num_nodes, dtype=np.int64), degrees)
+        row_max = np.zeros(self.num_nodes, dtype=self.probs.dtype)
+        if len(self.probs):
+            row_max[degrees > 0] = np.maximum.reduceat(self.probs, self.indptr[:-1][degrees > 0])
+        remove &= self.probs < row_max[rows]
+
+        removed = int(np.count_nonzero(remove))
+        if removed:
+            shares = self._remove_edges(remove)
+            self.pruned_share += float(shares.max())
+            logger.info("Pruned %d edges below %g, up to %.3g of a row", removed, epsilon,
+                        shares.max())
+
+        return removed
+
+    """
+    Removes every edge that can't be part of a walk reaching the goal
+    (defaults to the network's goal) within path_length transitions: edges
+    into nodes that are too far from the goal, and edges out of the goal,
+    since walks stop there. Returns the number of edges removed.
+
+    The removed probability isn't shared out over the rest of the row, so a
+    walk that would have taken one of these edges stops (STUCK) instead, and
+    the chance of reaching the goal from any node is exactly what it was.
+    With normalise_rows on the rows have to keep adding up to 1, so it is
+    shared out instead, which does change the chances, and the largest share
+    taken from a row that still has edges is added to pruned_share like
+    prune_weak_edges.
+    """
+    def prune_unreachable_edges(self, goal_node_id=None, path_length=None):
+
+        if goal_node_id is None:
+            goal_node_id = self.goal_node_id
+        if path_length is None:
+            path_length = self.path_length
+
+        distances = self.goal_distances(goal_node_id)
+
+        # after taking an edge there are at most path_length - 1 moves left
+        remove = distances[self.indices] > path_length - 1
+        if 0 <= goal_node_id < self.num_nodes:
+            remove[self.indptr[goal_node_id]:self.indptr[goal_node_id + 1]] = True
+
+        removed = int(np.count_nonzero(remove))
+        if removed:
+            shares = self._remove_edges(remove, share_out=not self.normalise_rows)
+            if self.normalise_rows:
+                # rows left without edges couldn't reach the goal anyway
+                shares[np.diff(self.indptr) == 0] = 0
+                self.pruned_share += float(shares.max())
+            logger.info("Pruned %d edges that can't reach goal %d", removed, goal_node_id)
+
+        return removed
+
+    """
+    Takes the edges marked in remove out of the arrays, sharing their
+    probability out over the rest of each row (in proportion) unless
+    share_out is False. Rows keep
+    their order, every node just has fewer edges. Anything built from the
+    old arrays (edge lookup, goal distances, checkpoint base) is rebuilt the
+    next time it's needed. Returns the share of each row that was removed.
+    """
+    def _remove_edges(self, remove, share_out=True):
+
+        num_nodes = self.num_nodes
+        rows = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(self.indptr))
+        keep = ~remove
+
+        row_totals = np.bincount(rows, weights=self.probs, minlength=num_nodes)
+        removed_totals = np.bincount(rows[remove], weights=self.probs[remove],
+                                     minlength=num_nodes)
+        kept_totals = row_totals - removed_totals
+        shares = removed_totals / np.where(row_totals > 0, row_totals, 1)
+
+        probs = self.probs[keep]
+        if share_out:
+            scale = np.where(kept_totals > 0,
+                             row_totals / np.where(kept_totals > 0, kept_totals, 1), 1)
+            probs = np.clip(probs * scale[rows[keep]], 0, 1).astype(self.probs.dtype)
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[keep], minlength=num_nodes), out=indptr[1:])
+        low_epochs = None if self.low_epochs is None else self.low_epochs[keep]
+
+        self.set_arrays(indptr, self.indices[keep], probs)
+        self.low_epochs = low_epochs
+        self.edges_pruned += int(np.count_nonzero(remove))
+
+        return shares
+
+    """
+    Memory used by every array the network keeps, in bytes, plus how much
+    accuracy the storage choices may have cost, as measured now:
+        row_sum_error         - furthest any row (with edges) is from adding
+                                up to 1, from rounding to the storage type
+                                and all of the updates since
+        pruned_share          - the most any step of a walk can have changed
+                                through pruning, see prune_weak_edges
+        hit_probability_error - only if a reference network (e.g. a float64,
+                                unpruned copy trained the same way) is given:
+                                the largest difference between its and this
+                                network's goal_hit_probabilities
+    """
+    def storage_report(self, reference=None):
+
+        self.initialise_all_node_neighbours()
+        arrays = {"indptr": self.indptr, "indices": self.indices,
+                  "probs": self.probs, "cutoffs": self.cutoffs}
+        if self.edge_lookup is not None:
+            arrays["edge_lookup"] = self.edge_lookup
+        if self.goal_index is not None:
+            arrays["goal_distances"] = self.goal_index[2]
+        if self.low_epochs is not None:
+            arrays["low_epochs"] = self.low_epochs
+        if self.changed_nodes is not None:
+            arrays["changed_nodes"] = self.changed_nodes
+
+        array_bytes = {name: int(sum(part.nbytes for part in array))
+                       if isinstance(array, tuple) else int(array.nbytes)
+                       for name, array in arrays.items()}
+        total = sum(array_bytes.values())
+
+        degrees = np.diff(self.indptr)
+        rows = np.repeat(np.arange(self.num_nodes), degrees)
+        row_sums = np.bincount(rows, weights=self.probs, minlength=self.num_nodes)
+
+        report = {
+            "nodes": self.num_nodes,
+            "edges": len(self.indices),
+            "dtype": self.probs.dtype.name,
+            "bytes": array_bytes,
+            "total_bytes": total,
+            "bytes_per_edge": total / max(len(self.indices), 1),
+            "edges_pruned": self.edges_pruned,
+            "row_sum_error": float(np.abs(row_sums[degrees > 0] - 1).max(initial=0.0)),
+            "pruned_share": self.pruned_share,
+        }
+
+        if reference is not None:
+            difference = reference.goal_hit_probabilities(self.path_length) - \
+                self.goal_hit_probabilities()
+            report["hit_probability_error"] = float(np.abs(difference).max(initial=0.0))
+
+        return report
+
+    def __str__(self):
+        return "CSRNetwork with {} nodes and {} edges".format(self.num_nodes, len(self.indices))
+
+    # Same example graphs as Network, so results can be compared directly.
+
+    def construct_graph_example_1(self, goal_node):
+
+        self.goal_node_id = goal_node
+        self.add_node_to_network(0, [1, 3])
+        self.add_node_to_network(1, [2])
+        self.add_node_to_network(2, [3, 4])
+        self.add_node_to_network(3, [2, 5])
+        self.add_node_to_network(4, [0])
+        self.add_node_to_network(5, [])
+
+    """
+    Chain where node i has edges to i + 1 and i + 2, and the last two nodes
+    are sinks. Built straight into the arrays (replacing anything already in
+    the network), so even very long chains only take a moment.
+    """
+    def construct_graph_example_2(self, num_nodes, goal_node):
+        from graph_generators import chain_of_k
+        from graph_io import edges_to_csr
+
+        self.goal_node_id = goal_node
+
+        sources, targets = chain_of_k(num_nodes, k=2)
+        self.set_arrays(*edges_to_csr(sources, targets, num_nodes))
+
+
+"""
+How far short of 1 a row of probabilities of the given type can add up to
+and still be treated as adding up to 1: ROW_SUM_TOLERANCE, or more for
+float32 and float16, which can't add up that closely.
+"""
+@lru_cache(maxsize=None)
+def row_sum_tolerance(dtype):
+    return max(ROW_SUM_TOLERANCE, 8 * float(np.finfo(dtype).eps))
+
+
+"""
+Running total of probs restarted at the beginning of every row, so each entry
+is the upper bound of that edge's choice range. Done for all rows at once.
+The total is always worked out (and returned) in float64.
+"""
+def row_cumsum(indptr, probs):
+
+    cutoffs = np.cumsum(probs, dtype=np.float64)
+    if len(cutoffs) == 0:
+        return cutoffs
+
+    # subtract whatever had built up before each row started
+    row_starts = indptr[:-1]
+    carried = np.zeros(len(row_starts), dtype=np.float64)
+    not_first = row_starts > 0
+    carried[not_first] = cutoffs[row_starts[not_first] - 1]
+    cutoffs -= np.repeat(carried, np.diff(indptr))
+
+    # rows that add up to 1 end at exactly 1 (see ROW_SUM_TOLERANCE)
+    row_ends = indptr[1:][indptr[1:] > row_starts] - 1
+    last = cutoffs[row_ends]
+    tolerance = row_sum_tolerance(probs.dtype)
+    cutoffs[row_ends] = np.where((last >= 1 - tolerance) & (last < 1), 1.0, last)
+
+    return cutoffs
+
+
+"""
+Positions of every edge belonging to the given rows, all joined together,
+along with which of the given rows each one came from.
+"""
+def row_edges(indptr, rows):
+
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    row_of_edge = np.repeat(np.arange(len(rows)), lengths)
+
+    # offset of each edge within its own row
+    first_edge = np.cumsum(lengths) - lengths
+    positions = starts[row_of_edge] + np.arange(len(row_of_edge)) - first_edge[row_of_edge]
+
+    return positions, row_of_edge
+
+
+"""
+Breadth-first search backwards along the edges from the goal, giving the
+fewest steps from every node to the goal (UNREACHABLE if there's no way).
+Each round finds all nodes one step further out at once.
+"""
+def goal_distances(indptr, indices, goal_node_id):
+
+    num_nodes = len(indptr) - 1
+    distances = np.full(num_nodes, UNREACHABLE, dtype=np.int32)
+    if not 0 <= goal_node_id < num_nodes:
+        return distances
+
+    # reverse the edges: for each node, which nodes have an edge to it
+    sources = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    reverse_indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=num_nodes), out=reverse_indptr[1:])
+    reverse_sources = sources[order]
+
+    distances[goal_node_id] = 0
+    frontier = np.array([goal_node_id], dtype=np.int64)
+    distance = 0
+
+    while len(frontier):
+        distance += 1
+        positions, _ = row_edges(reverse_indptr, frontier)
+        previous = reverse_sources[positions]
+        frontier = np.unique(previous[distances[previous] == UNREACHABLE])
+        distances[frontier] = distance
+
+    return distances
+
+
+"""
+Advances all walks in lockstep. Every step draws one block of random numbers
+(one per walk still going) and finds each walk's next edge with a binary
+search over its row of cutoffs, done for all walks together. Walks end at
+the goal, at a node with no edges, when the random number falls past the
+last range, or after path_length transitions.
+
+Random numbers come from rng (a numpy Generator or RandomStream) if given,
+otherwise from the global numpy.random state. If distances (from goal_distances) are given,
+walks also end once the goal is further away than the steps left.
+
+Several sets of probabilities over the same graph (e.g. one per goal, see
+multi_goal.MultiGoalNetwork) can be walked together: cutoffs (and distances)
+are then 2D with one row per set, tables gives the row each walk uses, and
+goal_node_id can be an array with each walk's own goal.
+
+With return_outcomes, also returns how many transitions each walk made and
+whether it ended on its goal, (walks, lengths, goal_reached), both recorded
+as the walks go rather than worked out from the walks array afterwards.
+
+normalised says every row adds up to 1 (see CSRNetwork.normalise_rows), so
+each search can stop at the row's last edge and no walk falls off the end.
+
+With return_edges, the position in the arrays of the edge taken at every
+step, shape (n_walks, path_length) with -1 once a walk has ended, is added
+to the end of what's returned, e.g. (walks, lengths, goal_reached, edges).
+It can be passed on to CSRNetwork.update_from_walks.
+"""
+def simulate_walks(indptr, indices, cutoffs, starts, path_length, goal_node_id, rng=None,
+                   distances=None, tables=None, return_outcomes=False, normalised=False,
+                   return_edges=False):
+
+    n_walks = len(starts)
+    walks = np.full((n_walks, path_length + 1), -1, dtype=indices.dtype)
+    walks[:, 0] = starts
+
+    # which walks are still going, and where they are
+    walkers = np.arange(n_walks)
+    current = np.array(starts, dtype=np.int64)
+
+    lengths = np.zeros(n_walks, dtype=np.int64)
+    goal_reached = np.zeros(n_walks, dtype=bool)
+    if return_edges:
+        taken_edges = np.full((n_walks, path_length), -1, dtype=np.int64)
+
+    # one goal for every walk, or one each
+    goals = np.asarray(goal_node_id)
+    goal = goals
+
+    # enough halvings to search the longest row
+    degrees = np.diff(indptr)
+    search_steps = int(degrees.max()).bit_length() if len(degrees) else 0
+    last_edge = max(cutoffs.shape[-1] - 1, 0)
+
+    # each walk's table starts this far into the flattened cutoffs
+    offset = 0
+    if tables is not None:
+        tables = np.asarray(tables, dtype=np.int64)
+        offsets = tables * cutoffs.shape[-1]
+        cutoffs = cutoffs.reshape(-1)
+
+    for step in range(1, path_length + 1):
+
+        if goals.ndim:
+            goal = goals[walkers]
+
+        # end walks sitting on the goal or with nowhere to go
+        lower, upper = indptr[current], indptr[current + 1]
+        on_goal = current == goal
+        if return_outcomes:
+            goal_reached[walkers[on_goal]] = True
+        going = ~on_goal & (upper > lower)
+        if distances is not None:
+            if tables is not None:
+                going &= distances[tables[walkers], current] <= path_length - step + 1
+            else:
+                going &= distances[current] <= path_length - step + 1
+        walkers, current = walkers[going], current[going]
+        lower, row_end = lower[going], upper[going]
+
+        if len(walkers) == 0:
+            break
+
+        if rng is None:
+            random_nums = random.rand(len(walkers))
+        else:
+            random_nums = rng.random(len(walkers))
+
+        if tables is not None:
+            offset = offsets[walkers]
+
+        # binary search for the first cutoff >= random number on each row
+        upper = row_end - 1 if normalised else row_end.copy()
+        for _ in range(search_steps):
+            searching = lower < upper
+            middle = (lower + upper) >> 1
+            below = cutoffs[np.minimum(middle, last_edge) + offset] < random_nums
+            lower = np.where(searching & below, middle + 1, lower)
+            upper = np.where(searching & ~below, middle, upper)
+
+        # past the end of the row means the probabilities don't add up to 1
+        edges = lower
+        if not normalised:
+            chosen = lower < row_end
+            walkers, edges = walkers[chosen], lower[chosen]
+
+        current = indices[edges].astype(np.int64)
+        walks[walkers, step] = current
+        if return_outcomes:
+            lengths[walkers] = step
+        if return_edges:
+            taken_edges[walkers, step - 1] = edges
+
+    if not return_outcomes and not return_edges:
+        return walks
+
+    results = (walks,)
+    if return_outcomes:
+        # walks still going after the last step may have just reached the goal
+        if goals.ndim:
+            goal = goals[walkers]
+        goal_reached[walkers[current == goal]] = True
+        results += (lengths, goal_reached)
+    if return_edges:
+        results += (taken_edges,)
+
+    return results
+
+
+"""
+Every (node, next node) transition in a walks array, in walk order, with the
+change update_from_walks gives it (reinforcement, or -reinforcement if the
+walk missed the goal). Transitions out of nodes with fewer than 2 edges are
+left out, since those rows never change. If edges (from simulate_walks with
+return_edges) is given, the edge each transition used is returned too,
+otherwise None. Returns (sources, targets, changes, edges).
+"""
+def walk_transitions(indptr, walks, goal_reached, reinforcement, edges=None):
+
+    # every (node, next node) transition, in walk order
+    sources, targets = walks[:, :-1], walks[:, 1:]
+    taken = targets >= 0
+    changes = np.where(goal_reached, reinforcement, -reinforcement)
+    changes = np.broadcast_to(changes[:, None], taken.shape)[taken]
+    sources, targets = sources[taken].astype(np.int64), targets[taken]
+    if edges is not None:
+        edges = np.asarray(edges)[taken]
+
+    # nodes with fewer than 2 edges are never changed
+    keep = np.diff(indptr)[sources] >= 2
+    if edges is not None:
+        edges = edges[keep]
+    return sources[keep], targets[keep], changes[keep], edges
+
+
+if __name__ == "__main__":
+
+    network = CSRNetwork(training_tests=100,
+                         path_length=10,
+                         reinforcement=0.1
+                         )
+
+    network.construct_graph_example_2(num_nodes=20, goal_node=12)
+    network.initialise_all_node_neighbours()
+
+    network.run_all_training_tests()
+
+    print(network)
+    for node_id in range(network.num_nodes):
+        neighbour_ids, probabilities = network.get_row(node_id)
+        print("Node ID: {}, Connections: {}".format(node_id, dict(zip(neighbour_ids.tolist(), probabilities.tolist()))))
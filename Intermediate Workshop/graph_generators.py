@@ -0,0 +1,147 @@
+import numpy as np
+
+"""
+Synthetic graphs for testing and load testing, made with whole-array NumPy
+operations instead of adding nodes one at a time.
+
+Every generator returns the edges as two int64 arrays (sources, targets),
+edge i going from sources[i] to targets[i]. Turn them into a network with
+graph_io.network_from_edges (repeated edges are dropped there), e.g.
+
+    sources, targets = power_law(1000000, mean_degree=10, seed=1)
+    network = network_from_edges(sources, targets, training_tests=100,
+                                 path_length=10, reinforcement=0.01)
+
+Random generators take a seed (an int, or a numpy Generator), so the same
+seed always gives the same graph.
+"""
+
+
+"""
+Each node i has edges to the next k nodes, i + 1 ... i + k. Nodes near the
+end whose edges would go past the last node get no edges at all (they're
+sinks), the same as construct_graph_example_2 with k = 2.
+"""
+def chain_of_k(num_nodes, k=2):
+
+    # nodes that have all k of their neighbours
+    num_sources = max(num_nodes - k, 0)
+
+    sources = np.repeat(np.arange(num_sources, dtype=np.int64), k)
+    targets = sources + np.tile(np.arange(1, k + 1, dtype=np.int64), num_sources)
+    return sources, targets
+
+
+"""
+rows x columns grid, node id row * columns + column, with edges to the
+neighbouring cells up, down, left and right (fewer along the borders).
+"""
+def grid(rows, columns):
+
+    node_ids = np.arange(rows * columns, dtype=np.int64).reshape(rows, columns)
+
+    sources, targets = [], []
+    for source, target in ((node_ids[:, :-1], node_ids[:, 1:]),   # right
+                           (node_ids[:, 1:], node_ids[:, :-1]),   # left
+                           (node_ids[:-1, :], node_ids[1:, :]),   # down
+                           (node_ids[1:, :], node_ids[:-1, :])):  # up
+        sources.append(source.ravel())
+        targets.append(target.ravel())
+
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+
+    # keep each node's edges together
+    order = np.argsort(sources, kind='stable')
+    return sources[order], targets[order]
+
+
+"""
+Random graph with num_nodes * mean_degree edges, each from a random node to
+a random other node (the G(n, m) version of Erdos-Renyi, which doesn't need
+to look at every possible pair of nodes). With fewer than two nodes there's
+no other node to point at, so there are no edges.
+"""
+def erdos_renyi(num_nodes, mean_degree, seed=None):
+
+    if num_nodes < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    num_edges = int(round(num_nodes * mean_degree))
+
+    # sorted, so each node's edges are together
+    sources = np.sort(rng.integers(0, num_nodes, num_edges))
+
+    # pick from the other num_nodes - 1 nodes, skipping over the source
+    targets = rng.integers(0, num_nodes - 1, num_edges)
+    targets += targets >= sources
+
+    return sources, targets
+
+
+"""
+Random graph whose out-degrees follow a power law (a few nodes have lots of
+edges, most have very few), with neighbours picked uniformly at random.
+exponent is the power law's exponent, mean_degree the average out-degree.
+"""
+def power_law(num_nodes, mean_degree, exponent=2.5, seed=None):
+
+    rng = np.random.default_rng(seed)
+
+    # Pareto samples scaled so the average degree comes out near mean_degree
+    raw = rng.pareto(exponent - 1, num_nodes) + 1
+    degrees = np.round(raw * mean_degree / raw.mean())
+    degrees = np.minimum(degrees, max(num_nodes - 1, 0)).astype(np.int64)
+
+    sources = np.repeat(np.arange(num_nodes, dtype=np.int64), degrees)
+    targets = rng.integers(0, num_nodes, len(sources))
+    return sources, targets
+
+
+"""
+Watts-Strogatz small world: every node starts with edges to its k nearest
+nodes around a ring (k // 2 each side), then each edge is pointed at a random
+node instead with probability rewire. A single node has no ring to be on,
+so it gets no edges (rather than loops back to itself).
+"""
+def small_world(num_nodes, k=4, rewire=0.1, seed=None):
+
+    if num_nodes < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    half = max(k // 2, 1)
+
+    steps = np.concatenate((np.arange(1, half + 1), -np.arange(1, half + 1)))
+    sources = np.repeat(np.arange(num_nodes, dtype=np.int64), len(steps))
+    targets = (sources + np.tile(steps, num_nodes)) % num_nodes
+
+    rewired = rng.random(len(sources)) < rewire
+    targets[rewired] = rng.integers(0, num_nodes, int(rewired.sum()))
+
+    # rewiring onto itself would make a loop, so leave those edges alone
+    loops = rewired & (targets == sources)
+    targets[loops] = ((sources + np.tile(steps, num_nodes)) % num_nodes)[loops]
+
+    return sources, targets
+
+
+"""
+{node_id: [neighbour ids]} from edge arrays, for building a Network (or
+anything else that adds nodes one at a time). Every node up to num_nodes is
+included, with an empty list if it has no edges.
+"""
+def to_adjacency(sources, targets, num_nodes=None):
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if num_nodes is None:
+        num_nodes = int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+    neighbours = targets[order].tolist()
+
+    return {node_id: neighbours[indptr[node_id]:indptr[node_id + 1]]
+            for node_id in range(num_nodes)}
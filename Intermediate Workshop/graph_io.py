@@ -0,0 +1,190 @@
+import json
+import os
+from itertools import islice
+
+import numpy as np
+
+from csr_network import CSRNetwork
+
+"""
+Loading and saving whole graphs at once, instead of calling
+add_node_to_network one node at a time.
+
+Three formats:
+    edge list - text file with one "node_id neighbour_id" pair per line,
+                read in chunks so the file never has to fit in memory as text.
+    NPZ       - a single .npz file holding the CSR arrays and settings.
+    mmap      - a directory of .npy files opened with numpy's memory mapping,
+                so even a 100M edge graph opens straight away and is only
+                read from disk as parts of it are used.
+"""
+
+# settings stored alongside the arrays, so a loaded network is ready to train
+SETTINGS = ("training_tests", "path_length", "reinforcement", "goal_node_id")
+
+
+"""
+Turns parallel arrays of edges (sources[i] -> targets[i]) into CSR arrays.
+Repeated edges are only kept once, edges keep the order they were given in,
+and every node's edges start with equal probability: 1 / the number of
+different neighbours, so each node's probabilities add up to 1.
+This isn't quite what Node.initialise_edges and
+CSRNetwork.add_node_to_network do when a neighbour id is repeated: they
+divide by the length of the list, repeats included, which leaves the row
+adding up to less than 1.
+"""
+def edges_to_csr(sources, targets, num_nodes=None):
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+
+    if len(sources) and (sources.min() < 0 or targets.min() < 0):
+        raise ValueError("Node ids must be non-negative integers")
+
+    if num_nodes is None:
+        num_nodes = int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+
+    # drop repeated edges, keeping the first of each
+    _, first = np.unique(sources * num_nodes + targets, return_index=True)
+    if len(first) < len(sources):
+        first.sort()
+        sources, targets = sources[first], targets[first]
+
+    # group edges by node without changing their order within a node
+    order = np.argsort(sources, kind='stable')
+    degrees = np.bincount(sources, minlength=num_nodes)
+
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(degrees, out=indptr[1:])
+    indices = targets[order].astype(CSRNetwork._index_dtype(num_nodes))
+
+    # all probabilities start equal, over the edges left after dropping repeats
+    probs = 1.0 / np.repeat(degrees, degrees).astype(np.float64)
+
+    return indptr, indices, probs
+
+
+"""
+Reads an edge list file (one "node_id neighbour_id" pair per line, lines
+starting with # ignored), chunk_size lines at a time, into a CSRNetwork.
+"""
+def load_edge_list(path, training_tests, path_length, reinforcement,
+                   chunk_size=1000000, delimiter=None):
+
+    source_chunks, target_chunks = [], []
+
+    with open(path) as edge_file:
+        while True:
+            lines = list(islice(edge_file, chunk_size))
+            if not lines:
+                break
+
+            pairs = np.loadtxt(lines, dtype=np.int64, comments='#',
+                               delimiter=delimiter, usecols=(0, 1), ndmin=2)
+            source_chunks.append(pairs[:, 0])
+            target_chunks.append(pairs[:, 1])
+
+    sources = np.concatenate(source_chunks) if source_chunks else np.zeros(0, dtype=np.int64)
+    targets = np.concatenate(target_chunks) if target_chunks else np.zeros(0, dtype=np.int64)
+
+    return network_from_edges(sources, targets, training_tests, path_length, reinforcement)
+
+
+"""
+Builds a CSRNetwork from parallel arrays of edges, e.g. from one of the
+graph_generators.
+"""
+def network_from_edges(sources, targets, training_tests, path_length, reinforcement,
+                       num_nodes=None, seed=None):
+
+    indptr, indices, probs = edges_to_csr(sources, targets, num_nodes)
+    return CSRNetwork.from_arrays(indptr, indices, probs,
+                                  training_tests, path_length, reinforcement, seed=seed)
+
+
+"""
+Writes a network's edges out as an edge list file.
+"""
+def save_edge_list(network, path, chunk_size=1000000):
+
+    network.initialise_all_node_neighbours()
+    sources = np.repeat(np.arange(network.num_nodes), np.diff(network.indptr))
+
+    with open(path, 'w') as edge_file:
+        for start in range(0, len(sources), chunk_size):
+            pairs = np.column_stack((sources[start:start + chunk_size],
+                                     network.indices[start:start + chunk_size]))
+            np.savetxt(edge_file, pairs, fmt='%d')
+
+
+"""
+Saves a network (arrays and settings) to a single .npz file.
+"""
+def save_npz(network, path, compressed=False):
+
+    network.initialise_all_node_neighbours()
+    arrays = dict(indptr=network.indptr, indices=network.indices, probs=network.probs)
+    for name in SETTINGS:
+        arrays[name] = np.asarray(getattr(network, name))
+
+    if compressed:
+        np.savez_compressed(path, **arrays)
+    else:
+        np.savez(path, **arrays)
+
+
+"""
+Loads a network saved with save_npz.
+"""
+def load_npz(path):
+
+    with np.load(path) as arrays:
+        network = CSRNetwork.from_arrays(arrays["indptr"], arrays["indices"], arrays["probs"],
+                                         arrays["training_tests"].item(),
+                                         arrays["path_length"].item(),
+                                         arrays["reinforcement"].item())
+        network.goal_node_id = arrays["goal_node_id"].item()
+
+    return network
+
+
+"""
+Saves a network as a directory of .npy files (plus settings.json) that
+load_mmap can open without reading it all in.
+"""
+def save_mmap(network, directory):
+
+    network.initialise_all_node_neighbours()
+    os.makedirs(directory, exist_ok=True)
+
+    for name in ("indptr", "indices", "probs", "cutoffs"):
+        np.save(os.path.join(directory, name + ".npy"), getattr(network, name))
+
+    with open(os.path.join(directory, "settings.json"), 'w') as settings_file:
+        json.dump({name: np.asarray(getattr(network, name)).item() for name in SETTINGS},
+                  settings_file)
+
+
+"""
+Opens a network saved with save_mmap. Nothing is read until it is used.
+mode is numpy's mmap_mode:
+    "c"  - changes stay in memory and the files are left alone (default)
+    "r+" - changes are written back to the files
+    "r"  - read only, for walking but not training
+"""
+def load_mmap(directory, mode="c"):
+
+    with open(os.path.join(directory, "settings.json")) as settings_file:
+        settings = json.load(settings_file)
+
+    arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mode)
+              for name in ("indptr", "indices", "probs", "cutoffs")}
+
+    network = CSRNetwork.from_arrays(arrays["indptr"], arrays["indices"], arrays["probs"],
+                                     settings["training_tests"],
+                                     settings["path_length"],
+                                     settings["reinforcement"],
+                                     cutoffs=arrays["cutoffs"])
+    network.goal_node_id = settings["goal_node_id"]
+
+    return network
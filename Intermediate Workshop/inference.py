@@ -0,0 +1,193 @@
+import heapq
+from functools import lru_cache
+
+import numpy as np
+
+from csr_network import UNREACHABLE, goal_distances
+
+"""
+Read-only copy of a trained network for answering queries, rather than
+training:
+    next_hop(node_id)               - most likely neighbour to go to next
+    best_paths(start, goal, horizon, k)
+                                    - the k most likely paths from start to
+                                      the goal in at most horizon moves
+plus next_hops and best_paths_batch for many queries at once.
+
+The probabilities used are the real chances of make_choice picking each edge
+(CSRNetwork.effective_probabilities), so a path's probability is the chance
+of a walk taking exactly that path. Nothing can change once it's frozen
+(the arrays are read-only), so best_paths answers are kept in an LRU cache
+and repeated queries are just a dictionary lookup.
+
+Usage:
+    policy = network.freeze()
+    policy.next_hop(0)
+    probability, path = policy.best_paths(0, k=3)[0]
+"""
+class FrozenPolicy(object):
+
+    def __init__(self, indptr, indices, probabilities, goal_node_id, path_length,
+                 cache_size=4096):
+
+        self.indptr = self._read_only(np.array(indptr, dtype=np.int64))
+        self.indices = self._read_only(np.array(indices))
+        self.probabilities = self._read_only(np.array(probabilities, dtype=np.float64))
+        self.goal_node_id = goal_node_id
+        self.path_length = path_length  # default horizon
+
+        num_nodes = len(self.indptr) - 1
+        rows = np.repeat(np.arange(num_nodes), np.diff(self.indptr))
+
+        # -log of each edge's probability, the "cost" of taking it
+        with np.errstate(divide='ignore'):
+            self.costs = self._read_only(-np.log(self.probabilities))
+
+        # most likely edge on every row (first one on ties), -1 for rows with
+        # no edges or nothing with any chance of being picked
+        best_next = np.full(num_nodes, -1, dtype=np.int64)
+        possible = self.probabilities > 0
+        order = np.lexsort((-self.probabilities[possible], rows[possible]))
+        best_rows = rows[possible][order]
+        first = np.r_[True, best_rows[1:] != best_rows[:-1]] if len(best_rows) else best_rows
+        best_next[best_rows[first]] = self.indices[possible][order][first]
+        self.best_next = self._read_only(best_next)
+
+        # fewest moves to each goal, worked out once per goal
+        self.distances = {}
+
+        self.cached_best_paths = lru_cache(maxsize=cache_size)(self._best_paths)
+
+    """
+    Freezes a trained Network or CSRNetwork.
+    """
+    @classmethod
+    def from_network(cls, network, cache_size=4096):
+
+        if hasattr(network, "to_csr"):
+            network = network.to_csr()
+        network.initialise_all_node_neighbours()
+
+        return cls(network.indptr, network.indices, network.effective_probabilities(),
+                   network.goal_node_id, network.path_length, cache_size)
+
+    @staticmethod
+    def _read_only(array):
+        array.setflags(write=False)
+        return array
+
+    @property
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    """
+    Most likely neighbour to go to from node_id, or None if there's nowhere
+    to go.
+    """
+    def next_hop(self, node_id):
+        if not 0 <= node_id < self.num_nodes:
+            return None
+        next_node_id = self.best_next[node_id]
+        return None if next_node_id < 0 else int(next_node_id)
+
+    """
+    next_hop for a whole array of node ids at once (-1 for nowhere to go).
+    """
+    def next_hops(self, node_ids):
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        known = (node_ids >= 0) & (node_ids < self.num_nodes)
+        return np.where(known, self.best_next[np.where(known, node_ids, 0)], -1)
+
+    """
+    Fewest moves from every node to the goal.
+    """
+    def goal_distances(self, goal_node_id):
+        if goal_node_id not in self.distances:
+            self.distances[goal_node_id] = goal_distances(self.indptr, self.indices,
+                                                          goal_node_id)
+        return self.distances[goal_node_id]
+
+    """
+    The k most likely paths from start to the goal (defaults to the trained
+    goal) in at most horizon moves (defaults to the trained path length),
+    most likely first, as a tuple of (probability, (node ids...)).
+    Answers are cached, keyed by (start, goal, horizon, k).
+    """
+    def best_paths(self, start, goal_node_id=None, horizon=None, k=1):
+
+        if goal_node_id is None:
+            goal_node_id = self.goal_node_id
+        if horizon is None:
+            horizon = self.path_length
+
+        return self.cached_best_paths(int(start), int(goal_node_id), int(horizon), int(k))
+
+    """
+    The single most likely path, as (probability, (node ids...)), or None if
+    the goal can't be reached.
+    """
+    def best_path(self, start, goal_node_id=None, horizon=None):
+        paths = self.best_paths(start, goal_node_id, horizon, k=1)
+        return paths[0] if paths else None
+
+    """
+    best_paths for many start nodes, one answer per start.
+    """
+    def best_paths_batch(self, starts, goal_node_id=None, horizon=None, k=1):
+        return [self.best_paths(start, goal_node_id, horizon, k) for start in starts]
+
+    """
+    Cache statistics (hits, misses, maxsize, currsize) of best_paths.
+    """
+    def cache_info(self):
+        return self.cached_best_paths.cache_info()
+
+    """
+    Search behind best_paths. Paths are grown cheapest (most likely) first
+    from a priority queue keyed on the total -log probability, so the first
+    k that arrive at the goal are the k most likely. Like Viterbi, each
+    (node, moves made) state is only grown from its k best ways of getting
+    there, and states that can't reach the goal in the moves left are
+    dropped.
+    """
+    def _best_paths(self, start, goal_node_id, horizon, k):
+
+        num_nodes = self.num_nodes
+        if not 0 <= start < num_nodes or not 0 <= goal_node_id < num_nodes or k < 1:
+            return ()
+
+        distances = self.goal_distances(goal_node_id)
+        if distances[start] == UNREACHABLE or distances[start] > horizon:
+            return ()
+
+        indptr, indices, costs = self.indptr, self.indices, self.costs
+        found = []
+        times_grown = {}
+
+        # (cost so far, moves made, path as a tuple of node ids)
+        queue = [(0.0, 0, (start,))]
+        while queue and len(found) < k:
+            cost, moves, path = heapq.heappop(queue)
+            node_id = path[-1]
+
+            # walks stop at the goal
+            if node_id == goal_node_id:
+                found.append((float(np.exp(-cost)), path))
+                continue
+
+            state = (node_id, moves)
+            times_grown[state] = times_grown.get(state, 0) + 1
+            if times_grown[state] > k:
+                continue
+
+            moves_left = horizon - moves - 1
+            for position in range(indptr[node_id], indptr[node_id + 1]):
+                neighbour_id = int(indices[position])
+                if costs[position] == np.inf or distances[neighbour_id] > moves_left:
+                    continue
+                heapq.heappush(queue, (cost + costs[position], moves + 1, path + (neighbour_id,)))
+
+        return tuple(found)
+
+    def __str__(self):
+        return "FrozenPolicy with {} nodes and {} edges".format(self.num_nodes, len(self.indices))
@@ -0,0 +1,192 @@
+import logging
+from collections import Counter
+from time import perf_counter
+
+import numpy as np
+
+logger = logging.getLogger("neural_net.metrics")
+
+"""
+Counters and timers for watching training as it runs.
+
+Give a network one (network.metrics = TrainingMetrics()) and its training
+loops keep count of:
+    - hops sampled, walks completed and walks that reached the goal
+    - time spent sampling walks, updating probabilities and drawing
+    - how long the paths were (path_length_histogram)
+all in total and per epoch (one run_all_training_tests call, or one
+ParallelTrainer round). Epoch summaries are also logged at SUMMARY level.
+
+When network.metrics is None (the default) the loops skip all of this, so
+the only cost is one check per step.
+
+profile_hook, if given, is called as profile_hook(name, seconds) after every
+timed call, where name is the function that was timed, e.g.
+"transition_to_neighbour" or "update_node_probabilities". Useful for
+sending timings on to a profiler or monitoring system.
+"""
+class TrainingMetrics(object):
+
+    PHASES = ("sampling", "updating", "drawing")
+
+    def __init__(self, profile_hook=None):
+        self.profile_hook = profile_hook
+
+        # totals since the metrics were created
+        self.hops = 0
+        self.walks = 0
+        self.goal_hits = 0
+        self.seconds = dict.fromkeys(self.PHASES, 0.0)
+        self.path_lengths = Counter()  # {path length: number of walks}
+
+        # finished epochs, oldest first, as summary dicts
+        self.epochs = []
+        self.start_epoch()
+
+    """
+    Starts counting a new epoch (end_epoch does this for you).
+    """
+    def start_epoch(self):
+        self.epoch_hops = 0
+        self.epoch_walks = 0
+        self.epoch_goal_hits = 0
+        self.epoch_seconds = dict.fromkeys(self.PHASES, 0.0)
+
+    """
+    Time now, to pass to lap once the timed call has finished.
+    """
+    @staticmethod
+    def clock():
+        return perf_counter()
+
+    """
+    Adds the time since started to the given phase, and tells the profile
+    hook (as name, defaulting to the phase). Returns the time now, so the
+    next phase can be timed from it.
+    """
+    def lap(self, phase, started, name=None):
+
+        now = perf_counter()
+        seconds = now - started
+        self.seconds[phase] += seconds
+        self.epoch_seconds[phase] += seconds
+
+        if self.profile_hook is not None:
+            self.profile_hook(name or phase, seconds)
+
+        return now
+
+    """
+    Counts one finished walk, given as a path of (node_id, neighbour_id)
+    transitions. It reached the goal if it ended there.
+    """
+    def record_path(self, path, goal_node_id):
+        self.record_walk(len(path), len(path) > 0 and path[-1][1] == goal_node_id)
+
+    """
+    Counts one finished walk of the given number of transitions.
+    """
+    def record_walk(self, length, reached_goal):
+
+        self.hops += length
+        self.walks += 1
+        self.epoch_hops += length
+        self.epoch_walks += 1
+        self.path_lengths[length] += 1
+
+        if reached_goal:
+            self.goal_hits += 1
+            self.epoch_goal_hits += 1
+
+    """
+    Counts a whole array of walks from simulate_walks at once (rows padded
+    with -1 after the walk ended). goal_node_id can also be one goal per walk.
+    If simulate_walks returned the lengths and goal_reached outcomes, pass
+    them in and the walks array isn't looked at again (it can be None).
+    """
+    def record_walks(self, walks, goal_node_id, lengths=None, goal_reached=None):
+
+        if lengths is None or goal_reached is None:
+            walks = np.asarray(walks)
+            if len(walks) == 0:
+                return
+            if lengths is None:
+                lengths = np.count_nonzero(walks[:, 1:] >= 0, axis=1)
+            if goal_reached is None:
+                goal_reached = walks[np.arange(len(walks)), lengths] == goal_node_id
+
+        lengths = np.asarray(lengths)
+        if len(lengths) == 0:
+            return
+        hits = int(np.count_nonzero(goal_reached))
+        hops = int(lengths.sum())
+
+        self.hops += hops
+        self.walks += len(lengths)
+        self.goal_hits += hits
+        self.epoch_hops += hops
+        self.epoch_walks += len(lengths)
+        self.epoch_goal_hits += hits
+
+        counts = np.bincount(lengths)
+        for length in np.flatnonzero(counts):
+            self.path_lengths[int(length)] += int(counts[length])
+
+    """
+    Finishes the current epoch: stores and logs its summary, then starts
+    counting a new one.
+    """
+    def end_epoch(self):
+
+        summary = {
+            "epoch": len(self.epochs) + 1,
+            "walks": self.epoch_walks,
+            "hops": self.epoch_hops,
+            "goal_hits": self.epoch_goal_hits,
+            "goal_hit_rate": self.epoch_goal_hits / max(self.epoch_walks, 1),
+            "seconds": dict(self.epoch_seconds),
+        }
+        self.epochs.append(summary)
+
+        logger.info("Epoch %d: %d walks, %d hops, goal hit rate %.3f, "
+                    "sampling %.3fs, updating %.3fs, drawing %.3fs",
+                    summary["epoch"], summary["walks"], summary["hops"],
+                    summary["goal_hit_rate"], *(self.epoch_seconds[phase] for phase in self.PHASES))
+
+        self.start_epoch()
+        return summary
+
+    """
+    Fraction of all walks so far that reached the goal.
+    """
+    def goal_hit_rate(self):
+        return self.goal_hits / max(self.walks, 1)
+
+    """
+    Number of walks of each length, as a list indexed by path length.
+    """
+    def path_length_histogram(self):
+        if not self.path_lengths:
+            return []
+        histogram = [0] * (max(self.path_lengths) + 1)
+        for length, count in self.path_lengths.items():
+            histogram[length] = count
+        return histogram
+
+    """
+    Everything recorded so far as a plain dict (e.g. for json.dump).
+    """
+    def summary(self):
+        return {
+            "walks": self.walks,
+            "hops": self.hops,
+            "goal_hits": self.goal_hits,
+            "goal_hit_rate": self.goal_hit_rate(),
+            "seconds": dict(self.seconds),
+            "path_length_histogram": self.path_length_histogram(),
+            "epochs": list(self.epochs),
+        }
+
+    def __str__(self):
+        return "{} walks, {} hops, goal hit rate {:.3f}".format(self.walks, self.hops,
+                                                               self.goal_hit_rate())
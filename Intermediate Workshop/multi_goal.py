@@ -0,0 +1,240 @@
+import numpy as np
+
+from csr_network import CSRNetwork, simulate_walks
+
+"""
+Learns a separate set of probabilities for each of several goals at once,
+over a single copy of the graph.
+
+The graph structure (indptr and indices) is taken from a CSRNetwork and
+shared by every goal; only the probabilities are kept per goal, as a
+(number of goals, number of edges) table, with a matching table of cutoffs.
+Each training round walks are split between the goals and all of them are
+simulated together, so training for 10 goals costs about the same as
+training one network on the same total number of walks.
+
+Walks start from node 0 like the other networks, unless start_weights is
+given: a weight per node (array, or {node_id: weight}) to pick each walk's
+start from at random, e.g. {0: 1, 7: 3} starts a quarter of the walks at
+node 0 and the rest at node 7.
+
+Usage:
+    network = CSRNetwork(training_tests=100, path_length=10, reinforcement=0.01)
+    network.construct_graph_example_2(num_nodes=20, goal_node=12)
+    network.initialise_all_node_neighbours()
+
+    multi = MultiGoalNetwork(network, goal_node_ids=[12, 15, 19], start_weights={0: 1, 3: 1})
+    multi.train(rounds=100, walks_per_round=3000)
+    multi.goal_network(15).get_row(0)
+"""
+class MultiGoalNetwork(object):
+
+    def __init__(self, network: CSRNetwork, goal_node_ids, start_weights=None):
+        network.initialise_all_node_neighbours()
+        self.network = network  # graph structure and training settings
+
+        self.goal_node_ids = np.asarray(goal_node_ids, dtype=np.int64)
+        if len(np.unique(self.goal_node_ids)) < len(self.goal_node_ids):
+            raise ValueError("Goal node ids must all be different")
+        self.goal_rows = {int(goal): row for row, goal in enumerate(self.goal_node_ids)}
+
+        # one row of probabilities (and cutoffs) per goal, all starting from
+        # the network's current probabilities
+        self.probs = np.tile(network.probs, (len(self.goal_node_ids), 1))
+        self.cutoffs = np.tile(network.cutoffs, (len(self.goal_node_ids), 1))
+
+        # running total of the start weights, to pick starts from
+        self.start_cutoffs = None
+        self.set_start_weights(start_weights)
+
+        # CSRNetworks looking at each goal's row of the tables, made when needed
+        self.goal_networks = {}
+
+    @property
+    def num_goals(self):
+        return len(self.goal_node_ids)
+
+    """
+    Sets where walks start from: None for node 0, or a weight per node (an
+    array, or {node_id: weight}).
+    """
+    def set_start_weights(self, start_weights):
+
+        if start_weights is None:
+            self.start_cutoffs = None
+            return
+
+        num_nodes = self.network.num_nodes
+        if isinstance(start_weights, dict):
+            weights = np.zeros(num_nodes, dtype=np.float64)
+            for node_id, weight in start_weights.items():
+                weights[node_id] = weight
+        else:
+            weights = np.asarray(start_weights, dtype=np.float64)
+
+        if len(weights) != num_nodes or weights.min() < 0 or weights.sum() <= 0:
+            raise ValueError("Start weights need a non-negative weight for every node")
+
+        self.start_cutoffs = np.cumsum(weights) / weights.sum()
+
+    """
+    Picks n_walks start nodes from the start weights.
+    """
+    def sample_starts(self, n_walks, rng=None):
+
+        if self.start_cutoffs is None:
+            return np.zeros(n_walks, dtype=np.int64)
+
+        if rng is None:
+            rng = self.network.random_stream
+        starts = np.searchsorted(self.start_cutoffs, rng.random(n_walks), side='right')
+        return np.minimum(starts, len(self.start_cutoffs) - 1)
+
+    """
+    A CSRNetwork for a single goal. It shares the graph and that goal's row of
+    the probability tables, so training or walking it changes this network too.
+    """
+    def goal_network(self, goal_node_id):
+
+        row = self.goal_rows[int(goal_node_id)]
+        if row not in self.goal_networks:
+            network = self.network
+            goal_network = CSRNetwork.from_arrays(network.indptr, network.indices,
+                                                  self.probs[row],
+                                                  network.training_tests,
+                                                  network.path_length,
+                                                  network.reinforcement,
+                                                  cutoffs=self.cutoffs[row])
+            goal_network.goal_node_id = int(goal_node_id)
+            goal_network.random_stream = network.random_stream
+            goal_network.normalise_rows = network.normalise_rows
+
+            # the edge lookup only depends on the graph, so build it just once
+            if network.edge_lookup is None:
+                network.find_edges(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+            goal_network.edge_lookup = network.edge_lookup
+
+            self.goal_networks[row] = goal_network
+
+        return self.goal_networks[row]
+
+    """
+    Simulates n_walks walks at once, shared out evenly between the goals
+    unless goal_node_ids (one goal per walk) is given. Starts are picked from
+    the start weights unless starts (one node per walk) is given.
+    Returns (walks, goals): walks is like CSRNetwork.simulate_walks and goals
+    is the goal each walk was aiming for. With return_outcomes, returns
+    (walks, goals, lengths, goal_reached). With return_edges, the edges taken
+    (see the simulate_walks function) are added to the end.
+    """
+    def simulate_walks(self, n_walks, path_length=None, goal_node_ids=None, starts=None,
+                       return_outcomes=False, return_edges=False):
+
+        network = self.network
+        if path_length is None:
+            path_length = network.path_length
+
+        if goal_node_ids is None:
+            tables = np.arange(n_walks) % self.num_goals
+        else:
+            tables = np.array([self.goal_rows[int(goal)] for goal in goal_node_ids],
+                              dtype=np.int64)
+        goals = self.goal_node_ids[tables]
+
+        if starts is None:
+            starts = self.sample_starts(n_walks)
+
+        distances = None
+        if network.prune_hopeless_walks:
+            distances = np.stack([self.goal_network(goal).goal_distances()
+                                  for goal in self.goal_node_ids])
+
+        results = simulate_walks(network.indptr, network.indices, self.cutoffs,
+                                 starts, path_length, goals, network.random_stream,
+                                 distances, tables=tables, return_outcomes=return_outcomes,
+                                 normalised=network.normalise_rows, return_edges=return_edges)
+        if not return_outcomes and not return_edges:
+            return results, goals
+        return (results[0], goals) + results[1:]
+
+    """
+    Reinforces a batch of walks, each towards its own goal (see
+    CSRNetwork.update_from_walks for goal_reached, ordering and edges).
+    """
+    def update_from_walks(self, walks, goals, goal_reached=None, ordering="sequential",
+                          edges=None):
+
+        walks = np.asarray(walks)
+        goals = np.asarray(goals)
+
+        for goal in np.unique(goals):
+            chosen = goals == goal
+            reached = None if goal_reached is None else np.asarray(goal_reached)[chosen]
+            goal_edges = None if edges is None else np.asarray(edges)[chosen]
+            self.goal_network(goal).update_from_walks(walks[chosen], reached, ordering=ordering,
+                                                      edges=goal_edges)
+
+    """
+    Runs the given number of training rounds, each simulating walks_per_round
+    walks (split between the goals) and then reinforcing all of them.
+    If network.metrics is set, each round is counted and timed as one epoch.
+    """
+    def train(self, rounds, walks_per_round, ordering="accumulate"):
+
+        metrics = self.network.metrics
+
+        for _ in range(rounds):
+
+            if metrics is not None:
+                clock = metrics.clock()
+
+            walks, goals, lengths, goal_reached, edges = self.simulate_walks(
+                walks_per_round, return_outcomes=True, return_edges=True)
+
+            if metrics is not None:
+                clock = metrics.lap("sampling", clock, "simulate_walks")
+
+            self.update_from_walks(walks, goals, goal_reached, ordering=ordering, edges=edges)
+
+            if metrics is not None:
+                metrics.lap("updating", clock, "update_from_walks")
+                metrics.record_walks(walks, goals, lengths, goal_reached)
+                metrics.end_epoch()
+
+    """
+    Exact chance of reaching each goal from each node, shape
+    (number of goals, number of nodes), see CSRNetwork.goal_hit_probabilities.
+    """
+    def goal_hit_probabilities(self, path_length=None):
+        return np.stack([self.goal_network(goal).goal_hit_probabilities(path_length)
+                         for goal in self.goal_node_ids])
+
+    """
+    Approximate memory used by the shared graph plus every goal's tables,
+    in bytes per edge.
+    """
+    def bytes_per_edge(self):
+        network = self.network
+        total = network.indptr.nbytes + network.indices.nbytes + self.probs.nbytes + \
+            self.cutoffs.nbytes
+        return total / max(len(network.indices), 1)
+
+    def __str__(self):
+        return "MultiGoalNetwork with {} goals over {}".format(self.num_goals, self.network)
+
+
+if __name__ == "__main__":
+
+    network = CSRNetwork(training_tests=100,
+                         path_length=10,
+                         reinforcement=0.01
+                         )
+    network.construct_graph_example_2(num_nodes=20, goal_node=12)
+    network.initialise_all_node_neighbours()
+
+    multi = MultiGoalNetwork(network, goal_node_ids=[12, 15, 19], start_weights={0: 1, 3: 1})
+    multi.train(rounds=100, walks_per_round=3000)
+
+    print(multi)
+    for goal, hit in zip(multi.goal_node_ids, multi.goal_hit_probabilities()):
+        print("Goal {}: chance of reaching it from node 0 is {:.3f}".format(goal, hit[0]))
@@ -1,7 +1,44 @@
-import networkx as nx
+import logging
+import sys
+from array import array
+from bisect import bisect_left
+from collections import deque
+from itertools import accumulate
+import numpy as np
 from numpy import random
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+
+from csr_network import ROW_SUM_TOLERANCE, CSRNetwork
+from random_streams import RandomStream
+from walk_result import WalkResult
+
+# networkx and matplotlib are only imported when something is drawn, so the
+# network can be built and trained on machines without a display.
+
+"""
+Verbosity levels for what the Network and its Nodes print while training:
+    QUIET   - nothing, the default. No messages are even formatted.
+    SUMMARY - one line per training test (path taken and reinforcement).
+    TRACE   - every random number, hop and probability update.
+"""
+QUIET = logging.WARNING
+SUMMARY = logging.INFO
+TRACE = logging.DEBUG
+
+logger = logging.getLogger("neural_net")
+
+"""
+Sets how much the Network and all Nodes print. Messages go to stdout unless
+a handler has already been set up for the "neural_net" logger.
+"""
+def set_verbosity(level):
+
+    logger.setLevel(level)
+
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
 
 """
 Object representing a node on the network.
@@ -14,6 +51,10 @@ class Node(object):
         self.edges = {}
         self.neighbours = {} # Mapping from ID to Actual Object
 
+        # cached running totals of the edge probabilities, used for sampling
+        self.choice_ids = None
+        self.choice_cutoffs = None
+
         # function to create edge dictionary of Neighbour_ID: Probability
         self.initialise_edges(neighbour_ids)
 
@@ -34,15 +75,14 @@ class Node(object):
 
     """
     Create dictionary of {neighbour_id: neighbour object}, for graph traversal.
+    Looks each neighbour up directly, so this only costs one step per edge.
     """
     def initialise_neighbours(self, node_dict):
 
-        for node_id, node in node_dict.items():
+        for neighbour_id in self.edges:
 
-            for neighbour_id in self.edges:
-
-                if node_id == neighbour_id:
-                    self.neighbours[neighbour_id] = node
+            if neighbour_id in node_dict:
+                self.neighbours[neighbour_id] = node_dict[neighbour_id]
 
         # print(self.neighbours)
 
@@ -63,58 +103,139 @@ class Node(object):
         return choice_dict
 
     """
-    Generates a random float between 0 and 1, and uses the choice dictionary created
-    to decide which edge to go to.
+    Caches the upper bound of every range in the choice dictionary, e.g.
+    {1: 0.5, 3: 0.5} gives ids (1, 3) and cutoffs [0.5, 1.0]. Only needs
+    rebuilding when the edge probabilities change.
     """
-    def make_choice(self):
-        random_num = random.rand()
-        print(random_num)
-        choice_dict = self.create_choice_dict()
-        print(choice_dict)
-        # decide which node to go to
-        for id in choice_dict:
-            # range is e.g. (0, 0.5)
-            range = choice_dict[id]
-            lower_bound = range[0]
-            upper_bound = range[1]
+    def build_choice_cutoffs(self):
+        self.choice_ids = tuple(self.edges)
+        self.choice_cutoffs = list(accumulate(self.edges.values()))
 
-            if lower_bound < random_num <= upper_bound:
-                return id
+        # a row that adds up to 1 (give or take rounding) ends at exactly 1,
+        # so every random number picks an edge
+        if self.choice_cutoffs and 1 - ROW_SUM_TOLERANCE <= self.choice_cutoffs[-1] < 1:
+            self.choice_cutoffs[-1] = 1.0
+
+    """
+    Generates a random float between 0 and 1, and uses the cached cutoffs
+    to decide which edge to go to. Binary search finds the first range
+    (lower, upper] holding the number, same as scanning the choice dictionary.
+    The number comes from random_stream (a RandomStream) if given, otherwise
+    from numpy's global random state.
+    """
+    def make_choice(self, random_stream=None):
+        if self.choice_cutoffs is None:
+            self.build_choice_cutoffs()
+
+        if random_stream is not None:
+            random_num = random_stream.next()
+        else:
+            random_num = random.rand()
+        if logger.isEnabledFor(TRACE):
+            logger.debug("%s", random_num)
+            logger.debug("%s", self.create_choice_dict())
+
+        # decide which node to go to
+        choice = bisect_left(self.choice_cutoffs, random_num)
+        if choice < len(self.choice_ids):
+            return self.choice_ids[choice]
 
         # if an error occurs
         return None
 
     """
-    Recursive function that travels between nodes and tracks the path
-    taken. Path ends if you reach the goal node or a node with no neighbours,
-    or if you run out of moves from the limited path length.
+    Travels between nodes and tracks the path taken. Path ends if you reach
+    the goal node or a node with no neighbours, or if you run out of moves
+    from the limited path length. Uses a loop rather than recursion, so long
+    paths don't hit Python's recursion limit.
+    If goal_distances ({node_id: steps to goal}, see Network.get_goal_distances)
+    is given, the path also ends once the goal is further away than the
+    moves left, since it can't be reached any more. Choices use random_stream
+    if given (see make_choice).
     """
-    def transition_to_neighbour(self, limit, goal_node_id):
+    def transition_to_neighbour(self, limit, goal_node_id, goal_distances=None,
+                                random_stream=None):
+        return self.walk(limit, goal_node_id, goal_distances, random_stream).path
+
+    """
+    Same walk as transition_to_neighbour, but returns a WalkResult that also
+    has the set of nodes visited, whether the goal was reached and why the
+    walk ended, all recorded on the way.
+    """
+    def walk(self, limit, goal_node_id, goal_distances=None, random_stream=None):
 
         # going to be a list of (current_node, next_node)
         path = []
+        visited = set()
+        node = self
+
+        # Base cases: end if we reach goal, if no more transitions left, or
+        # if there is nowhere to go to
+        while True:
+            if node.id == goal_node_id:
+                ended = WalkResult.GOAL
+                break
+            if limit < 1:
+                ended = WalkResult.OUT_OF_MOVES
+                break
+            if len(node.neighbours) == 0:
+                ended = WalkResult.NO_NEIGHBOURS
+                break
+
+            # end if the goal is out of reach
+            if goal_distances is not None and goal_distances.get(node.id, limit + 1) > limit:
+                ended = WalkResult.HOPELESS
+                break
+
+            # make choice and add to path
+            next_node_id = node.make_choice(random_stream)
+            if next_node_id not in node.neighbours:
+                # probabilities on this row don't add up to 1, or the chosen
+                # neighbour isn't in the network
+                ended = WalkResult.STUCK
+                break
+            path.append((node.id, next_node_id))
+            if logger.isEnabledFor(TRACE):
+                logger.debug("Next node: %s", next_node_id)
+
+            # move on to the neighbour
+            node = node.neighbours[next_node_id]
+            visited.add(next_node_id)
+            limit -= 1
+
+        if path:
+            visited.add(self.id)
+        return WalkResult(path, visited, ended)
 
-        # Base case
-        if limit < 1:
-            # end if no more transitions left
-            return path
-        elif len(self.neighbours) == 0:
-            # end if there is nowhere to go to
-            return path
-        elif self.id == goal_node_id:
-            # end if we reach goal
-            return path
-
-        # make choice and add to path
-        next_node_id = self.make_choice()
-        path.append((self.id, next_node_id))
-        next_node = self.neighbours[next_node_id]
-        print("Next node: {}".format(next_node_id))
-
-        # recursive step, add the transitions of all subsequent neighbours
-        path.extend(next_node.transition_to_neighbour(limit - 1, goal_node_id))
-
-        return path
+    """
+    Same walk as transition_to_neighbour, but writes the ids of the nodes
+    visited into a preallocated buffer (e.g. a numpy int array of size
+    limit + 1) instead of building a list. buffer[0] is this node. Returns
+    the number of transitions made, so the path is buffer[:count + 1].
+    """
+    def transition_into(self, buffer, limit, goal_node_id, goal_distances=None,
+                        random_stream=None):
+
+        if len(buffer) < limit + 1:
+            raise ValueError("Buffer needs room for {} node ids".format(limit + 1))
+
+        node = self
+        buffer[0] = node.id
+        count = 0
+
+        while count < limit and len(node.neighbours) > 0 and node.id != goal_node_id:
+            if goal_distances is not None and \
+                    goal_distances.get(node.id, limit + 1) > limit - count:
+                break
+            next_node_id = node.make_choice(random_stream)
+            if next_node_id not in node.neighbours:
+                # same as a STUCK walk
+                break
+            node = node.neighbours[next_node_id]
+            count += 1
+            buffer[count] = node.id
+
+        return count
 
     """
     Returns the connected neighbours from the neighbour dictionary, in a format
@@ -131,9 +252,11 @@ class Node(object):
 
     """
     Positively or negatively reinforces the chosen edge on the path,
-    as to help the model learn.
+    as to help the model learn. With normalise, the probabilities are then
+    rescaled to add up to 1 again, which keeping them between 0 and 1 can
+    otherwise break.
     """
-    def update_probabilities(self, node_id, change):
+    def update_probabilities(self, node_id, change, normalise=False):
 
         # node_id is the node that we travelled to on the path
 
@@ -144,7 +267,9 @@ class Node(object):
         # change for each other node
         proportional_change = change / (len(self.edges) - 1)
 
-        print("Node {} Before probability change: {}".format(self.id, self.edges))
+        trace = logger.isEnabledFor(TRACE)
+        if trace:
+            logger.debug("Node %s Before probability change: %s", self.id, self.edges)
         for key in self.edges:
             # update probability
             if key == node_id:
@@ -160,41 +285,451 @@ class Node(object):
             elif self.edges[key] > 1:
                 self.edges[key] = 1
 
-        print("Node {} After probability change: {}".format(self.id, self.edges))
+        if normalise:
+            self.normalise()
+
+        if trace:
+            logger.debug("Node %s After probability change: %s", self.id, self.edges)
+
+        # sampling ranges have changed, rebuild them on the next choice
+        self.choice_cutoffs = None
+
+    """
+    Rescales the probabilities to add up to 1 (unless they're all 0).
+    """
+    def normalise(self):
+
+        total = sum(self.edges.values())
+        if total > 0:
+            for key in self.edges:
+                self.edges[key] /= total
+
+        self.choice_cutoffs = None
+
+    """
+    Replaces the edges with the given {neighbour_id: probability} mapping.
+    """
+    def set_edges(self, edges):
+        self.edges = dict(edges)
+
+        # sampling ranges have changed, rebuild them on the next choice
+        self.choice_cutoffs = None
+
+    def __str__(self):
+        return "Node ID: {}, Connections: {}".format(self.id, self.edges)
+
+"""
+Smaller version of Node for very large networks, with the same public
+methods. Instead of an edges dictionary and a neighbours dictionary per node,
+neighbour ids and probabilities are kept in two parallel typed arrays
+(array('i') and array('d')), there is no per-instance __dict__ (__slots__),
+and all nodes share the network's {id: node} dictionary to find their
+neighbours. Nodes with no edges all share the same empty arrays.
+
+edges and neighbours still work, but are built as new dictionaries each time
+they're used, so they're for inspecting a node rather than for hot loops.
+Choices scan the running total of the probabilities instead of caching it,
+which gives the same choices as Node.make_choice for the same random numbers.
+A walk ends (rather than raising an error) if the probabilities run out
+before the random number, or the chosen neighbour isn't in the network.
+
+Use it with Network(..., node_class=CompactNode).
+"""
+class CompactNode(object):
+
+    __slots__ = ("id", "neighbour_ids", "probabilities", "node_dict")
+
+    # shared by every node without edges
+    NO_IDS = array('i')
+    NO_PROBABILITIES = array('d')
+
+    def __init__(self, id, neighbour_ids):
+
+        self.id = id
+        self.node_dict = None  # the network's {id: node}, set by initialise_neighbours
+        self.initialise_edges(neighbour_ids)
+
+    """
+    Sets up the neighbour id and probability arrays. All probabilities will
+    start equal (repeated ids are only kept once, as with Node).
+    """
+    def initialise_edges(self, neighbour_ids):
+
+        # avoid division by 0
+        if len(neighbour_ids) == 0:
+            self.neighbour_ids = self.NO_IDS
+            self.probabilities = self.NO_PROBABILITIES
+            return
+
+        initial_probability = 1.0 / len(neighbour_ids)
+        unique_ids = list(dict.fromkeys(neighbour_ids))
+        self.neighbour_ids = array('i', unique_ids)
+        self.probabilities = array('d', [initial_probability]) * len(unique_ids)
+
+    """
+    Replaces the edges with the given {neighbour_id: probability} mapping.
+    """
+    def set_edges(self, edges):
+        edges = dict(edges)
+        if len(edges) == 0:
+            self.neighbour_ids = self.NO_IDS
+            self.probabilities = self.NO_PROBABILITIES
+        else:
+            self.neighbour_ids = array('i', edges.keys())
+            self.probabilities = array('d', edges.values())
+
+    """
+    {neighbour_id: probability}, built from the arrays.
+    """
+    @property
+    def edges(self):
+        return dict(zip(self.neighbour_ids, self.probabilities))
+
+    @edges.setter
+    def edges(self, edges):
+        self.set_edges(edges)
+
+    """
+    {neighbour_id: neighbour object} for the neighbours in the network.
+    """
+    @property
+    def neighbours(self):
+        node_dict = self.node_dict
+        if node_dict is None:
+            return {}
+        return {neighbour_id: node_dict[neighbour_id]
+                for neighbour_id in self.neighbour_ids if neighbour_id in node_dict}
+
+    """
+    Keeps hold of the network's {id: node} dictionary to find neighbours in.
+    Nodes added to it later are found too, without any rewiring.
+    """
+    def initialise_neighbours(self, node_dict):
+        self.node_dict = node_dict
+
+    """
+    Same as Node.create_choice_dict.
+    """
+    def create_choice_dict(self):
+        choice_dict = {}
+        choice_cutoff = 0
+        for id, transition_probability in zip(self.neighbour_ids, self.probabilities):
+            choice_dict[id] = choice_cutoff, choice_cutoff + transition_probability
+            choice_cutoff += transition_probability
+
+        return choice_dict
+
+    """
+    Position in the arrays of the edge a random number picks, i.e. the first
+    range (lower, upper] holding it, or None if the ranges run out.
+    """
+    def choose_edge(self, random_stream=None):
+
+        if random_stream is not None:
+            random_num = random_stream.next()
+        else:
+            random_num = random.rand()
+        if logger.isEnabledFor(TRACE):
+            logger.debug("%s", random_num)
+            logger.debug("%s", self.create_choice_dict())
+
+        choice_cutoff = 0.0
+        for position, transition_probability in enumerate(self.probabilities):
+            choice_cutoff += transition_probability
+            if choice_cutoff >= random_num:
+                return position
+
+        # a row that adds up to 1 (give or take rounding) always picks an edge
+        if choice_cutoff >= 1 - ROW_SUM_TOLERANCE:
+            return len(self.probabilities) - 1
+
+        return None
+
+    """
+    Same as Node.make_choice: the id of the neighbour to go to, or None.
+    """
+    def make_choice(self, random_stream=None):
+        position = self.choose_edge(random_stream)
+        if position is None:
+            return None
+        return self.neighbour_ids[position]
+
+    """
+    The neighbour to go to next, or None if the walk has to end here.
+    """
+    def next_node(self, random_stream):
+        position = self.choose_edge(random_stream)
+        if position is None:
+            return None
+        return self.node_dict.get(self.neighbour_ids[position])
+
+    """
+    Same walk as Node.transition_to_neighbour, list of (current_node, next_node).
+    """
+    def transition_to_neighbour(self, limit, goal_node_id, goal_distances=None,
+                                random_stream=None):
+        return self.walk(limit, goal_node_id, goal_distances, random_stream).path
+
+    """
+    Same as Node.walk.
+    """
+    def walk(self, limit, goal_node_id, goal_distances=None, random_stream=None):
+
+        path = []
+        visited = set()
+        node = self
+
+        while True:
+            if node.id == goal_node_id:
+                ended = WalkResult.GOAL
+                break
+            if limit < 1:
+                ended = WalkResult.OUT_OF_MOVES
+                break
+            if len(node.neighbour_ids) == 0:
+                ended = WalkResult.NO_NEIGHBOURS
+                break
+
+            # end if the goal is out of reach
+            if goal_distances is not None and goal_distances.get(node.id, limit + 1) > limit:
+                ended = WalkResult.HOPELESS
+                break
+
+            next_node = node.next_node(random_stream)
+            if next_node is None:
+                ended = WalkResult.STUCK
+                break
+
+            path.append((node.id, next_node.id))
+            if logger.isEnabledFor(TRACE):
+                logger.debug("Next node: %s", next_node.id)
+
+            node = next_node
+            visited.add(node.id)
+            limit -= 1
+
+        if path:
+            visited.add(self.id)
+        return WalkResult(path, visited, ended)
+
+    """
+    Same walk as Node.transition_into, writing node ids into buffer.
+    """
+    def transition_into(self, buffer, limit, goal_node_id, goal_distances=None,
+                        random_stream=None):
+
+        if len(buffer) < limit + 1:
+            raise ValueError("Buffer needs room for {} node ids".format(limit + 1))
+
+        node = self
+        buffer[0] = node.id
+        count = 0
+
+        while count < limit and len(node.neighbour_ids) > 0 and node.id != goal_node_id:
+            if goal_distances is not None and \
+                    goal_distances.get(node.id, limit + 1) > limit - count:
+                break
+            node = node.next_node(random_stream)
+            if node is None:
+                break
+            count += 1
+            buffer[count] = node.id
+
+        return count
+
+    """
+    Same as Node.get_edges.
+    """
+    def get_edges(self):
+        return [(self.id, neighbour) for neighbour in self.neighbour_ids]
+
+    def get_id(self):
+        return self.id
+
+    """
+    Same as Node.update_probabilities, done on the arrays.
+    """
+    def update_probabilities(self, node_id, change, normalise=False):
+
+        probabilities = self.probabilities
+
+        # if no more than 1 edge, do nothing
+        if len(probabilities) < 2:
+            return
+
+        # change for each other node
+        proportional_change = change / (len(probabilities) - 1)
+
+        trace = logger.isEnabledFor(TRACE)
+        if trace:
+            logger.debug("Node %s Before probability change: %s", self.id, self.edges)
+        for position, key in enumerate(self.neighbour_ids):
+            if key == node_id:
+                probability = probabilities[position] + change
+            else:
+                probability = probabilities[position] - proportional_change
+
+            # Ensure probabilities remain between desired values.
+            if probability < 0:
+                probability = 0
+            elif probability > 1:
+                probability = 1
+            probabilities[position] = probability
+
+        if normalise:
+            self.normalise()
+
+        if trace:
+            logger.debug("Node %s After probability change: %s", self.id, self.edges)
+
+    """
+    Same as Node.normalise.
+    """
+    def normalise(self):
+
+        probabilities = self.probabilities
+        total = sum(probabilities)
+        if total > 0:
+            for position in range(len(probabilities)):
+                probabilities[position] /= total
 
     def __str__(self):
         return "Node ID: {}, Connections: {}".format(self.id, self.edges)
 
 """
 Class representing the entire Network, with many nodes within.
+
+graph is a networkx graph (e.g. nx.MultiDiGraph()) that mirrors the network
+for drawing. Pass None to skip it, e.g. for headless training; one is built
+from the nodes if you draw later anyway.
+
+seed fixes the network's random numbers, so the same seed gives the same
+paths and learned probabilities every run.
+
+node_class is the class used for every node: Node, or CompactNode to use
+much less memory per node.
+
+normalise_rows keeps every node's probabilities adding up to 1: they're
+rescaled when the node is added and after every update. Without it, keeping
+each probability between 0 and 1 can leave a node's probabilities adding up
+to more than 1 (the last edges can never be picked) or less (walks can get
+stuck). Turning it on later rescales every node straight away.
 """
 class Network(object):
 
-    def __init__(self, graph, training_tests, path_length, reinforcement):
-        self.graph = graph  # networkx graph object
+    def __init__(self, graph, training_tests, path_length, reinforcement, verbosity=None,
+                 seed=None, node_class=Node, normalise_rows=False):
+        self.graph = graph  # networkx graph object, or None
         self.nodes = {}  # mapping of all Node Ids: Node Objects
+        self.node_class = node_class  # Node or CompactNode
         self.goal_node_id = 0  # the node we want to reach
 
+        # where all of the network's random numbers come from
+        self.random_stream = RandomStream(seed)
+
+        # once neighbours are initialised, new nodes are wired in as they're added
+        self.neighbours_initialised = False
+
+        # end walks early once they can no longer reach the goal in time
+        self.prune_hopeless_walks = False
+        # keep every node's probabilities adding up to 1, see normalise_rows
+        self._normalise_rows = False
+        self.normalise_rows = normalise_rows
+        # (goal id, {node_id: steps to goal}) from the last get_goal_distances
+        self.goal_index = None
+        # ids of nodes whose probabilities have changed, only kept once
+        # track_changes is called (e.g. for incremental checkpoints)
+        self.changed_nodes = None
+        # goes up whenever nodes are added or replaced, so a checkpoint knows
+        # its saved copy of the graph is out of date
+        self.structure_version = 0
+        # ids that nodes have edges to, but haven't been added yet {id: [nodes]}
+        self.waiting_for = {}
+
+        # a metrics.TrainingMetrics to count and time training, or None
+        self.metrics = None
+
         # Parameters for training tests:
         self.training_tests = training_tests
         self.path_length = path_length
         self.reinforcement = reinforcement
 
-        # figure and axis for animation ONLY
-        self.figure, self.axis = plt.subplots(figsize=(6, 4))
+        # QUIET, SUMMARY or TRACE (None leaves the logging setup alone)
+        if verbosity is not None:
+            self.set_verbosity(verbosity)
+
+        # figure and axis for animation ONLY, created when first needed
+        self.figure, self.axis = None, None
+
+        # node positions for drawing, worked out once and then reused
+        self.layout = None
+
+        # matplotlib artists kept between animation frames, so each frame only
+        # recolours the nodes and edges that changed
+        self.node_artist = None
+        self.node_colours = None
+        self.node_index = {}
+        self.edge_artists = {}
+        self.frame_label = None
+        self.last_path = []
+        self.last_visited = []
+
+    """
+    Whether every node's probabilities are kept adding up to 1.
+    """
+    @property
+    def normalise_rows(self):
+        return self._normalise_rows
+
+    @normalise_rows.setter
+    def normalise_rows(self, normalise_rows):
+        self._normalise_rows = normalise_rows
+        if normalise_rows:
+            for node in self.nodes.values():
+                node.normalise()
+            if self.changed_nodes is not None:
+                self.changed_nodes.update(self.nodes)
+
+    """
+    Sets how much the network and its nodes print, see set_verbosity.
+    """
+    def set_verbosity(self, level):
+        set_verbosity(level)
 
     """
     Creates new node object from input and adds it to the network.
     Handles addition of node to networkx display graph as well.
+    If the neighbours have already been initialised, the new node is wired
+    in straight away (replacing an existing id has to find the nodes that
+    point at it, so that costs a pass over all nodes).
     """
     def add_node_to_network(self, node_id, neighbour_ids: list):
 
-        node = Node(node_id, neighbour_ids)
+        node = self.node_class(node_id, neighbour_ids)
+        if self.normalise_rows:
+            # repeated neighbour ids leave the starting probabilities short of 1
+            node.normalise()
+        replaced = node_id in self.nodes
         self.nodes[node_id] = node
+        self.goal_index = None
+        self.structure_version += 1
+
+        if self.neighbours_initialised:
+            self.wire_node(node)
+
+            # nodes that were already waiting for this id can now use it
+            for waiting_node in self.waiting_for.pop(node_id, []):
+                waiting_node.neighbours[node_id] = node
+
+            if replaced:
+                for other in self.nodes.values():
+                    if node_id in other.neighbours:
+                        other.neighbours[node_id] = node
 
         # add nodes and edges to graph (Networkx stuff)
-        self.graph.add_node(node_id)
-        self.graph.add_edges_from(node.get_edges())
+        if self.graph is not None:
+            self.graph.add_node(node_id)
+            self.graph.add_edges_from(node.get_edges())
 
     """
     Ensures all nodes have initialised their neighbour node objects, so they can
@@ -202,22 +737,83 @@ class Network(object):
     """
     def initialise_all_node_neighbours(self):
 
+        self.waiting_for = {}
         for node in self.nodes.values():
-            node.initialise_neighbours(self.nodes)
+            self.wire_node(node)
+
+        self.neighbours_initialised = True
+        self.goal_index = None
+
+    """
+    Initialises one node's neighbours and remembers any neighbour ids that
+    aren't in the network yet.
+    """
+    def wire_node(self, node):
+
+        node.initialise_neighbours(self.nodes)
+
+        neighbours = node.neighbours
+        for neighbour_id in node.edges:
+            if neighbour_id not in neighbours:
+                self.waiting_for.setdefault(neighbour_id, []).append(node)
+
+    """
+    Returns {node_id: fewest steps to the goal} for every node that can reach
+    the goal, found by searching backwards from the goal. Kept until the goal
+    changes or a node is added.
+    """
+    def get_goal_distances(self):
+
+        if self.goal_index is not None and self.goal_index[0] == self.goal_node_id:
+            return self.goal_index[1]
+
+        # who has an edge to each node (from the edges, so it doesn't matter
+        # whether the neighbours have been initialised yet)
+        nodes = self.nodes
+        previous_nodes = {}
+        for node_id, node in nodes.items():
+            for neighbour_id in node.edges:
+                if neighbour_id in nodes:
+                    previous_nodes.setdefault(neighbour_id, []).append(node_id)
+
+        distances = {self.goal_node_id: 0}
+        frontier = deque([self.goal_node_id])
+        while frontier:
+            node_id = frontier.popleft()
+            for previous_id in previous_nodes.get(node_id, []):
+                if previous_id not in distances:
+                    distances[previous_id] = distances[node_id] + 1
+                    frontier.append(previous_id)
+
+        self.goal_index = (self.goal_node_id, distances)
+        return distances
+
+    """
+    The goal distances to walk with, or None if walks aren't being pruned.
+    """
+    def walk_goal_distances(self):
+        if self.prune_hopeless_walks:
+            return self.get_goal_distances()
+        return None
 
     """
     Given a path taken through the network, will either reduce or increase all
     edge probabilities on that path, depending on whether it reached the goal.
+    reached_goal can be passed in if it's already known (e.g. from
+    Node.walk), otherwise the path is checked for the goal.
     """
-    def update_node_probabilities(self, path):
+    def update_node_probabilities(self, path, reached_goal=None):
 
         reinforcement = self.reinforcement
 
+        if reached_goal is None:
+            reached_goal = any(self.goal_node_id in transition for transition in path)
+
         # Check if goal reached (for positive reinforcement)
-        if self.goal_node_id in self.get_visited_nodes(path):
-            print("Positive reinforcement!")
+        if reached_goal:
+            logger.info("Positive reinforcement!")
         else:
-            print("Negative reinforcement!")
+            logger.info("Negative reinforcement!")
             reinforcement = -reinforcement
 
         # Transition is (node_id, neighbour_id)
@@ -227,7 +823,50 @@ class Network(object):
             neighbour_id = transition[1]
             node = self.nodes[node_id]
 
-            node.update_probabilities(neighbour_id, reinforcement)
+            node.update_probabilities(neighbour_id, reinforcement, self.normalise_rows)
+
+            if self.changed_nodes is not None:
+                self.changed_nodes.add(node_id)
+
+    """
+    Reinforces a batch of walks given as rows of node ids (like
+    CSRNetwork.simulate_walks, with -1 once a walk has ended). goal_reached
+    says which walks get positive reinforcement; by default it's every walk
+    that visited the goal. Same as calling update_node_probabilities on each
+    walk in turn, and the same as CSRNetwork.update_from_walks with
+    "sequential" ordering.
+    """
+    def update_from_walks(self, walks, goal_reached=None):
+
+        for i, walk in enumerate(walks):
+            node_ids = [int(node_id) for node_id in walk if node_id >= 0]
+
+            if goal_reached is None:
+                reached = len(node_ids) > 1 and self.goal_node_id in node_ids
+            else:
+                reached = goal_reached[i]
+            reinforcement = self.reinforcement if reached else -self.reinforcement
+
+            for node_id, neighbour_id in zip(node_ids, node_ids[1:]):
+                self.nodes[node_id].update_probabilities(neighbour_id, reinforcement,
+                                                         self.normalise_rows)
+
+            if self.changed_nodes is not None:
+                self.changed_nodes.update(node_ids[:-1])
+
+    """
+    Starts (or restarts) remembering which nodes have had their
+    probabilities changed. Returns the ids changed since the last call,
+    sorted, like CSRNetwork.track_changes.
+    """
+    def track_changes(self):
+
+        changed = np.zeros(0, dtype=np.int64)
+        if self.changed_nodes is not None:
+            changed = np.array(sorted(self.changed_nodes), dtype=np.int64)
+
+        self.changed_nodes = set()
+        return changed
 
     """
     Returns the node ids of all nodes on the given path.
@@ -245,14 +884,140 @@ class Network(object):
 
         return visited_node_ids
 
+    """
+    Takes a snapshot of the network (with its current learned probabilities)
+    as a CSRNetwork, for the fast array-based functions.
+    """
+    def to_csr(self):
+
+        num_nodes = max(self.nodes, default=-1) + 1
+        for node in self.nodes.values():
+            num_nodes = max(num_nodes, max(node.edges, default=-1) + 1)
+
+        degrees = np.zeros(num_nodes, dtype=np.int64)
+        for node_id, node in self.nodes.items():
+            degrees[node_id] = len(node.edges)
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        indices = np.empty(indptr[-1], dtype=CSRNetwork._index_dtype(num_nodes))
+        probs = np.empty(indptr[-1], dtype=np.float64)
+
+        for node_id, node in self.nodes.items():
+            start = indptr[node_id]
+            indices[start:start + len(node.edges)] = list(node.edges.keys())
+            probs[start:start + len(node.edges)] = list(node.edges.values())
+
+        network = CSRNetwork.from_arrays(indptr, indices, probs,
+                                         self.training_tests,
+                                         self.path_length,
+                                         self.reinforcement)
+        network.goal_node_id = self.goal_node_id
+        network.prune_hopeless_walks = self.prune_hopeless_walks
+        network.normalise_rows = self.normalise_rows
+        network.random_stream = self.random_stream
+        return network
+
+    """
+    Read-only copy of the trained network for answering "where next?" and
+    "most likely path" queries, see inference.FrozenPolicy.
+    """
+    def freeze(self, cache_size=4096):
+        from inference import FrozenPolicy
+        return FrozenPolicy.from_network(self, cache_size)
+
+    """
+    Copies learned probabilities back into the nodes from a CSRNetwork, e.g.
+    one restored from a checkpoint of this network (see checkpoint.restore).
+    Nodes the CSRNetwork has no edges for, such as ones added after the
+    checkpoint was taken, keep the probabilities they have.
+    """
+    def load_probabilities(self, csr_network):
+
+        for node_id, node in self.nodes.items():
+            if node_id >= csr_network.num_nodes:
+                continue
+            neighbour_ids, probabilities = csr_network.get_row(node_id)
+            if len(neighbour_ids) == 0:
+                continue
+            node.set_edges(zip(neighbour_ids.tolist(), probabilities.tolist()))
+            if self.normalise_rows:
+                node.normalise()
+
+        # the rows may not have the same edges as before
+        self.goal_index = None
+        self.structure_version += 1
+
+    """
+    Exact chance of reaching the goal within path_length moves from every
+    node, see CSRNetwork.goal_hit_probabilities.
+    """
+    def goal_hit_probabilities(self, path_length=None):
+        return self.to_csr().goal_hit_probabilities(path_length)
+
+    """
+    Simulates many walks at once from the starting node, using the current
+    probabilities. See CSRNetwork.simulate_walks for the result format.
+    """
+    def simulate_walks(self, n_walks, path_length, start_node_id=0):
+        return self.to_csr().simulate_walks(n_walks, path_length, start_node_id)
+
+    """
+    Returns the networkx display graph, building it from the nodes first if
+    the network was created without one.
+    """
+    def get_display_graph(self):
+        import networkx as nx
+
+        if self.graph is None:
+            self.graph = nx.MultiDiGraph()
+            for node_id, node in self.nodes.items():
+                self.graph.add_node(node_id)
+                self.graph.add_edges_from(node.get_edges())
+
+        return self.graph
+
+    """
+    Returns node positions for drawing. The spring layout is only worked out
+    the first time; after that the cached positions are reused, so nodes stay
+    put between frames. Nodes added since then are placed around the existing
+    ones, which don't move. refresh=True re-runs the layout starting from the
+    current positions (warm start), with the given number of iterations.
+    """
+    def get_layout(self, refresh=False, iterations=10):
+        import networkx as nx
+
+        graph = self.get_display_graph()
+
+        if self.layout is None:
+            self.layout = nx.spring_layout(graph)
+        elif refresh:
+            self.layout = nx.spring_layout(graph, pos=self.layout, iterations=iterations)
+        elif len(self.layout) < graph.number_of_nodes():
+            placed = [node_id for node_id in graph if node_id in self.layout]
+            self.layout = nx.spring_layout(graph, pos=self.layout, fixed=placed or None,
+                                           iterations=iterations)
+
+        return self.layout
+
     """
     Draws networkx graph display. Don't worry too much about this...
     But feel free to copy the code if you want to display your model.
+    Pass the WalkResult as walk to reuse its visited nodes and outcome.
     """
-    def draw_graph(self, path):
+    def draw_graph(self, path, walk=None):
+        import networkx as nx
+        import matplotlib.pyplot as plt
+
+        # visited nodes and outcome, from the walk if we have it
+        if walk is not None:
+            visited_node_ids, reached_goal = list(walk.visited), walk.reached_goal
+        else:
+            visited_node_ids = self.get_visited_nodes(path)
+            reached_goal = self.goal_node_id in visited_node_ids
 
         # Layout
-        pos = nx.spring_layout(self.graph)
+        pos = self.get_layout()
 
         # Draw nodes
         nx.draw_networkx_nodes(self.graph,
@@ -268,12 +1033,12 @@ class Network(object):
 
         # Nodes on path are red if goal not reached, green if it is reached.
         path_colour = 'r'
-        if self.goal_node_id in self.get_visited_nodes(path):
+        if reached_goal:
             path_colour = 'g'
 
         nx.draw_networkx_nodes(self.graph,
                                pos,
-                               nodelist=self.get_visited_nodes(path),
+                               nodelist=visited_node_ids,
                                node_color=path_colour)
 
 
@@ -288,55 +1053,234 @@ class Network(object):
         nx.draw_networkx_labels(self.graph, pos)
         plt.show()
 
+    """
+    Runs all training tests without drawing anything (no matplotlib needed).
+    If a checkpoint.Checkpointer is given, it gets the chance to save a
+    snapshot after every test.
+    If self.metrics is set, every test is counted and timed, and the whole
+    run is one epoch.
+    """
+    def run_all_training_tests(self, checkpointer=None):
+
+        metrics = self.metrics
+
+        i = 0
+        while i < self.training_tests:
+
+            if metrics is not None:
+                clock = metrics.clock()
+
+            # start transition
+            starting_node = self.nodes[0]
+            walk = starting_node.walk(limit=self.path_length,
+                                      goal_node_id=self.goal_node_id,
+                                      goal_distances=self.walk_goal_distances(),
+                                      random_stream=self.random_stream)
+            path = walk.path
+            logger.info("Path: %s", path)
+
+            if metrics is not None:
+                clock = metrics.lap("sampling", clock, "transition_to_neighbour")
+
+            self.update_node_probabilities(path, walk.reached_goal)
+
+            if metrics is not None:
+                metrics.lap("updating", clock, "update_node_probabilities")
+                metrics.record_walk(len(path), walk.reached_goal)
+
+            if checkpointer is not None:
+                checkpointer.tick()
+
+            i += 1
+
+        if metrics is not None:
+            metrics.end_epoch()
+
     """
     Simpler way to run training tests. Works in PyCharm, but not in Spyder...
+    Takes a checkpointer like run_all_training_tests.
     """
-    def run_all_training_tests_with_plots(self):
+    def run_all_training_tests_with_plots(self, checkpointer=None):
+
+        metrics = self.metrics
 
         i = 0
         while i < self.training_tests:
 
+            if metrics is not None:
+                clock = metrics.clock()
+
             # start transition
             starting_node = self.nodes[0]
-            path = starting_node.transition_to_neighbour(limit=self.path_length,
-                                                         goal_node_id=self.goal_node_id)
-            print("Path: {}".format(path))
+            walk = starting_node.walk(limit=self.path_length,
+                                      goal_node_id=self.goal_node_id,
+                                      goal_distances=self.walk_goal_distances(),
+                                      random_stream=self.random_stream)
+            path = walk.path
+            logger.info("Path: %s", path)
+
+            if metrics is not None:
+                clock = metrics.lap("sampling", clock, "transition_to_neighbour")
 
-            self.draw_graph(path)
+            self.draw_graph(path, walk)
 
-            self.update_node_probabilities(path)
+            if metrics is not None:
+                clock = metrics.lap("drawing", clock, "draw_graph")
+
+            self.update_node_probabilities(path, walk.reached_goal)
+
+            if metrics is not None:
+                metrics.lap("updating", clock, "update_node_probabilities")
+                metrics.record_walk(len(path), walk.reached_goal)
+
+            if checkpointer is not None:
+                checkpointer.tick()
 
             i += 1
 
+        if metrics is not None:
+            metrics.end_epoch()
+
+    """
+    Draws the whole graph once for the animation and keeps hold of the
+    artists. Later frames just change their colours and widths.
+    """
+    def init_animation_artists(self):
+        import networkx as nx
+        from matplotlib.colors import to_rgba
+
+        self.axis.clear()
+        graph = self.get_display_graph()
+        pos = self.get_layout()
+
+        # one collection for every node, coloured through node_colours
+        node_ids = list(graph.nodes())
+        self.node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        self.node_colours = np.tile(to_rgba('b'), (len(node_ids), 1))
+        if self.goal_node_id in self.node_index:
+            self.node_colours[self.node_index[self.goal_node_id]] = to_rgba('g')
+        self.node_artist = nx.draw_networkx_nodes(graph, pos, ax=self.axis,
+                                                  nodelist=node_ids,
+                                                  node_color=self.node_colours)
+
+        # one arrow per edge, so path edges can be restyled on their own
+        edge_list = [(node_id, neighbour_id) for node_id, neighbour_id, *_ in graph.edges()]
+        arrows = nx.draw_networkx_edges(graph, pos, ax=self.axis, edgelist=edge_list,
+                                        width=1.0, alpha=0.5, arrows=True)
+        self.edge_artists = dict(zip(edge_list, arrows))
+
+        nx.draw_networkx_labels(graph, pos, ax=self.axis)
+
+        self.frame_label = self.axis.text(0.01, 0.99, "", transform=self.axis.transAxes,
+                                          verticalalignment='top')
+        self.axis.set_xticks([])
+        self.axis.set_yticks([])
+        self.last_path = []
+        self.last_visited = []
+
+        return [self.node_artist, self.frame_label] + arrows
+
+    """
+    Recolours the nodes and edges of the previous path back to normal and
+    highlights the new path. Only touches the artists on the two paths.
+    Pass the WalkResult as walk to reuse its visited nodes and outcome.
+    """
+    def highlight_path(self, path, walk=None):
+        from matplotlib.colors import to_rgba
+
+        changed = []
+
+        # put the last path back to how it was
+        for edge in self.last_path:
+            arrow = self.edge_artists.get(edge)
+            if arrow is not None:
+                arrow.set_color('k')
+                arrow.set_linewidth(1.0)
+                changed.append(arrow)
+        for node_id in self.last_visited:
+            self.node_colours[self.node_index[node_id]] = to_rgba('b')
+        if self.goal_node_id in self.node_index:
+            self.node_colours[self.node_index[self.goal_node_id]] = to_rgba('g')
+
+        # Nodes and edges on path are red if goal not reached, green if it is reached.
+        if walk is not None:
+            visited_node_ids, reached_goal = list(walk.visited), walk.reached_goal
+        else:
+            visited_node_ids = self.get_visited_nodes(path)
+            reached_goal = self.goal_node_id in visited_node_ids
+        path_colour = 'g' if reached_goal else 'r'
+
+        for node_id in visited_node_ids:
+            self.node_colours[self.node_index[node_id]] = to_rgba(path_colour)
+        for edge in path:
+            arrow = self.edge_artists.get(edge)
+            if arrow is not None:
+                arrow.set_color(path_colour)
+                arrow.set_linewidth(8)
+                changed.append(arrow)
+
+        self.node_artist.set_facecolor(self.node_colours)
+        self.last_path = list(path)
+        self.last_visited = visited_node_ids
+
+        return [self.node_artist] + changed
+
     """
     Function for animated version of the plot (need to run in Spyder).
     """
     def run_training_test_frame(self, frame):
-        self.axis.clear()
+
+        if self.node_artist is None:
+            self.init_animation_artists()
+
+        metrics = self.metrics
+        if metrics is not None:
+            clock = metrics.clock()
+
         # start transition
-        starting_node = network.nodes[0]
-        path = starting_node.transition_to_neighbour(limit=self.path_length,
-                                                     goal_node_id=network.goal_node_id)
-        print("Path: {}".format(path))
+        starting_node = self.nodes[0]
+        walk = starting_node.walk(limit=self.path_length,
+                                  goal_node_id=self.goal_node_id,
+                                  goal_distances=self.walk_goal_distances(),
+                                  random_stream=self.random_stream)
+        path = walk.path
+        logger.info("Path: %s", path)
 
-        network.draw_graph(path)
+        if metrics is not None:
+            clock = metrics.lap("sampling", clock, "transition_to_neighbour")
 
-        network.update_node_probabilities(path)
+        changed = self.highlight_path(path, walk)
 
-        self.axis.set_title("Training test: {}".format(frame + 1))
-        self.axis.set_xticks([])
-        self.axis.set_yticks([])
+        if metrics is not None:
+            clock = metrics.lap("drawing", clock, "highlight_path")
+
+        self.update_node_probabilities(path, walk.reached_goal)
+
+        if metrics is not None:
+            metrics.lap("updating", clock, "update_node_probabilities")
+            metrics.record_walk(len(path), walk.reached_goal)
+
+        self.frame_label.set_text("Training test: {}".format(frame + 1))
+        return changed + [self.frame_label]
 
     """
     Run animation for all training tests. (Only runs well in Spyder).
+    With blit=True only the artists that changed are redrawn each frame.
     """
-    def run_animation(self, speed):
+    def run_animation(self, speed, blit=True):
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+
+        if self.figure is None:
+            self.figure, self.axis = plt.subplots(figsize=(6, 4))
 
         animated_graph = animation.FuncAnimation(self.figure,
                                                  self.run_training_test_frame,
+                                                 init_func=self.init_animation_artists,
                                                  frames=self.training_tests,
                                                  interval=speed,
-                                                 repeat=False
+                                                 repeat=False,
+                                                 blit=blit
                                                  )
         plt.show()
 
@@ -350,34 +1294,29 @@ class Network(object):
         self.add_node_to_network(4, [0])
         self.add_node_to_network(5, [])
 
+    """
+    Chain where node i has edges to i + 1 and i + 2, and the last two nodes
+    are sinks (see graph_generators.chain_of_k).
+    """
     def construct_graph_example_2(self, num_nodes, goal_node):
+        from graph_generators import chain_of_k, to_adjacency
 
         self.goal_node_id = goal_node
 
-        i = 0
-        skip = False
-        while i < num_nodes:
-            neighbours = [i + 1, i + 2]
-
-            for n_id in neighbours:
-                if n_id > num_nodes - 1:
-                    skip = True
-
-            if skip:
-                self.add_node_to_network(i, [])
-            else:
-                self.add_node_to_network(i, neighbours)
-
-            i += 1
+        sources, targets = chain_of_k(num_nodes, k=2)
+        for node_id, neighbour_ids in to_adjacency(sources, targets, num_nodes).items():
+            self.add_node_to_network(node_id, neighbour_ids)
 
 
 if __name__ == "__main__":
+    import networkx as nx
 
     # create network object
     network = Network(graph=nx.MultiDiGraph(),
                       training_tests=100,
                       path_length=7,
-                      reinforcement=0.1
+                      reinforcement=0.1,
+                      verbosity=TRACE  # QUIET for long runs
                       )
 
     # Example graph constructors:
@@ -390,6 +1329,9 @@ if __name__ == "__main__":
     # initialise Neighbour_ID: Neighbour Object dictionary for all nodes
     network.initialise_all_node_neighbours()
 
+    # Learning Loop - No Plots Version (For servers without a display)
+    # network.run_all_training_tests()
+
     # Learning Loop - Many Plots Version (For Pycharm)
     # network.run_all_training_tests_with_plots()
 
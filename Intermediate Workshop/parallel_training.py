@@ -0,0 +1,249 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from csr_network import CSRNetwork, simulate_walks, walk_transitions
+from random_streams import RandomStream
+
+"""
+Trains a CSRNetwork using many processes at once.
+
+The graph arrays (indptr, indices, probs, cutoffs) are moved into shared
+memory, so every worker reads the same arrays without copying them. Each
+training round, every worker simulates a share of the walks with its own
+random number stream, and the main process then applies all of the
+reinforcement updates in one batch. The same seed and number of workers
+always gives the same learned probabilities. Without a seed, the workers'
+streams are spawned from the network's own random stream.
+
+ordering is how the updates are applied, see CSRNetwork.update_from_walks:
+    "accumulate" (the default) - each worker adds up its own walks' changes
+                   per node and per edge, so the main process only has to
+                   add the workers' totals together and apply them
+    "sequential" - matches applying every walk one at a time (worker 0's
+                   walks first, then worker 1's, and so on). Workers send
+                   back their walks along with the edges they took, so the
+                   edges don't have to be looked up again.
+
+Usage:
+    with ParallelTrainer(network, workers=8, seed=42) as trainer:
+        trainer.train(rounds=100, walks_per_round=100000)
+"""
+class ParallelTrainer(object):
+
+    # arrays of the network that live in shared memory
+    SHARED_ARRAYS = ("indptr", "indices", "probs", "cutoffs")
+
+    def __init__(self, network: CSRNetwork, workers=None, seed=None, ordering="accumulate"):
+        self.network = network
+        self.workers = workers or os.cpu_count()
+        self.ordering = ordering
+
+        # every round and worker gets its own stream spawned from this
+        if seed is None:
+            self.seed_sequence = network.random_stream.seed_sequence.spawn(1)[0]
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.rounds_done = 0
+
+        self.shared_blocks = {}
+        self.pool = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    """
+    Copies the network arrays into shared memory and starts the workers.
+    The network keeps working as normal, its arrays are just views onto the
+    shared memory now, so updates made here are seen by the workers.
+    If the network prunes hopeless walks, the distances to the current goal
+    are shared too.
+    """
+    def start(self):
+
+        network = self.network
+        network.initialise_all_node_neighbours()
+
+        arrays = {name: getattr(network, name) for name in self.SHARED_ARRAYS}
+        if network.prune_hopeless_walks:
+            arrays["distances"] = network.goal_distances()
+
+        layout = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[:] = array
+
+            if name in self.SHARED_ARRAYS:
+                setattr(network, name, shared)
+            self.shared_blocks[name] = block
+            layout[name] = (block.name, array.shape, array.dtype.str)
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                        initializer=_attach_worker,
+                                        initargs=(layout,))
+
+    """
+    Stops the workers and moves the network arrays back into normal memory.
+    """
+    def close(self):
+
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+        for name, block in self.shared_blocks.items():
+            if name in self.SHARED_ARRAYS:
+                setattr(self.network, name, np.array(getattr(self.network, name)))
+            block.close()
+            block.unlink()
+        self.shared_blocks = {}
+
+    """
+    Runs the given number of training rounds. Each round simulates
+    walks_per_round walks (split evenly between the workers) from the current
+    probabilities, then reinforces every walk. If a checkpoint.Checkpointer
+    is given, it gets the chance to save a snapshot after every round.
+    If network.metrics is set, each round is counted and timed as one epoch.
+    """
+    def train(self, rounds, walks_per_round, start_node_id=0, checkpointer=None):
+
+        if self.pool is None:
+            raise RuntimeError("ParallelTrainer has not been started")
+
+        network = self.network
+        metrics = network.metrics
+        shares = np.full(self.workers, walks_per_round // self.workers)
+        shares[:walks_per_round % self.workers] += 1
+
+        for _ in range(rounds):
+
+            if metrics is not None:
+                clock = metrics.clock()
+
+            round_seed = self.seed_sequence.spawn(1)[0]
+            worker_seeds = round_seed.spawn(self.workers)
+
+            jobs = [self.pool.submit(_simulate_share, int(share), network.path_length,
+                                     start_node_id, network.goal_node_id, worker_seed,
+                                     network.normalise_rows, network.reinforcement,
+                                     self.ordering)
+                    for share, worker_seed in zip(shares, worker_seeds)]
+
+            # wait for every worker before touching the shared probabilities,
+            # then always apply in worker order, whichever finished first
+            results = [job.result() for job in jobs]
+
+            if metrics is not None:
+                clock = metrics.lap("sampling", clock, "simulate_walks")
+
+            if self.ordering == "accumulate":
+                lengths, goal_reached, totals = zip(*results)
+                lengths, goal_reached = np.concatenate(lengths), np.concatenate(goal_reached)
+                network.apply_totals(*self.add_up_totals(totals))
+                walks = None
+            else:
+                walks, lengths, goal_reached, edges = (np.concatenate(parts)
+                                                       for parts in zip(*results))
+                network.update_from_walks(walks, goal_reached, ordering=self.ordering,
+                                          edges=edges)
+
+            if metrics is not None:
+                metrics.lap("updating", clock, "update_from_walks")
+                metrics.record_walks(walks, network.goal_node_id, lengths, goal_reached)
+                metrics.end_epoch()
+
+            if checkpointer is not None:
+                checkpointer.tick()
+
+            self.rounds_done += 1
+
+    """
+    Adds together the (touched, node_totals, edge_ids, edge_totals) each
+    worker sent back, in worker order, giving the arguments for
+    CSRNetwork.apply_totals.
+    """
+    def add_up_totals(self, totals):
+
+        touched, node_totals, edge_ids, edge_totals = (np.concatenate(parts)
+                                                       for parts in zip(*totals))
+
+        touched, node_ids = np.unique(touched, return_inverse=True)
+        node_totals = np.bincount(node_ids, weights=node_totals, minlength=len(touched))
+        edge_totals = np.bincount(edge_ids, weights=edge_totals,
+                                  minlength=len(self.network.probs))
+
+        return touched, node_totals, edge_totals
+
+
+# Worker process side. Each worker attaches to the shared arrays once.
+worker_arrays = {}
+
+
+"""
+Runs once in each worker: attaches to the shared memory blocks by name.
+"""
+def _attach_worker(layout):
+
+    for name, (block_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        worker_arrays[name] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+
+"""
+Simulates this worker's share of a round's walks with its own random stream.
+For "accumulate" ordering, also adds up the walks' changes and returns
+(lengths, goal_reached, (touched, node_totals, edge_ids, edge_totals)),
+with only the nodes and edges that were used. Otherwise returns
+(walks, lengths, goal_reached, edges).
+"""
+def _simulate_share(n_walks, path_length, start_node_id, goal_node_id, seed, normalised,
+                    reinforcement, ordering):
+
+    indptr = worker_arrays["indptr"][1]
+    indices = worker_arrays["indices"][1]
+    cutoffs = worker_arrays["cutoffs"][1]
+    distances = worker_arrays["distances"][1] if "distances" in worker_arrays else None
+
+    rng = RandomStream(seed)
+    starts = np.full(n_walks, start_node_id, dtype=np.int64)
+
+    walks, lengths, goal_reached, edges = simulate_walks(indptr, indices, cutoffs, starts,
+                                                         path_length, goal_node_id, rng,
+                                                         distances, return_outcomes=True,
+                                                         normalised=normalised,
+                                                         return_edges=True)
+    if ordering != "accumulate":
+        return walks, lengths, goal_reached, edges
+
+    sources, _, changes, edges = walk_transitions(indptr, walks, goal_reached,
+                                                  reinforcement, edges)
+
+    touched, node_ids = np.unique(sources, return_inverse=True)
+    node_totals = np.bincount(node_ids, weights=changes, minlength=len(touched))
+    edge_ids, edge_positions = np.unique(edges, return_inverse=True)
+    edge_totals = np.bincount(edge_positions, weights=changes, minlength=len(edge_ids))
+
+    return lengths, goal_reached, (touched, node_totals, edge_ids, edge_totals)
+
+
+if __name__ == "__main__":
+
+    network = CSRNetwork(training_tests=100,
+                         path_length=10,
+                         reinforcement=0.01
+                         )
+    network.construct_graph_example_2(num_nodes=20, goal_node=12)
+
+    with ParallelTrainer(network, workers=4, seed=0) as trainer:
+        trainer.train(rounds=10, walks_per_round=1000)
+
+    for node_id in range(network.num_nodes):
+        neighbour_ids, probabilities = network.get_row(node_id)
+        print("Node ID: {}, Connections: {}".format(node_id, dict(zip(neighbour_ids.tolist(), probabilities.tolist()))))
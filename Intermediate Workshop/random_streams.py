@@ -0,0 +1,57 @@
+import numpy as np
+
+"""
+A seeded source of random numbers for walks.
+
+Each stream owns its own numpy Generator (PCG64 by default, or Philox), so
+runs with the same seed give the same paths, and nothing is shared between
+threads or processes. Random numbers used one at a time (one per hop) are
+drawn block_size at a time and handed out from a list, which is much
+cheaper than asking numpy for each number separately.
+
+spawn(n) gives n independent streams, e.g. one per walker or per worker,
+that are still fully decided by the original seed.
+"""
+class RandomStream(object):
+
+    def __init__(self, seed=None, block_size=65536, bit_generator=np.random.PCG64):
+
+        # seed can be an int, None (fresh entropy) or a SeedSequence
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+
+        self.bit_generator = bit_generator
+        self.generator = np.random.Generator(bit_generator(self.seed_sequence))
+
+        self.block_size = block_size
+        self.block = []
+        self.position = 0
+
+    """
+    Next random float in [0, 1), taken from the current block.
+    """
+    def next(self):
+
+        if self.position == len(self.block):
+            self.block = self.generator.random(self.block_size).tolist()
+            self.position = 0
+
+        random_num = self.block[self.position]
+        self.position += 1
+        return random_num
+
+    """
+    Array of random floats in [0, 1), drawn in one go (used by the
+    vectorised walk engine).
+    """
+    def random(self, size):
+        return self.generator.random(size)
+
+    """
+    n new independent streams, seeded from this one.
+    """
+    def spawn(self, n):
+        return [RandomStream(child, self.block_size, self.bit_generator)
+                for child in self.seed_sequence.spawn(n)]
@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger("neural_net.streaming_service")
+
+"""
+Trains a Network or CSRNetwork from paths taken by other systems, as they
+happen, instead of only from walks the network simulates itself.
+
+Path records come in through an asyncio.Queue, fed from any of:
+    - put()              - another coroutine in the same program
+    - tail_file()        - new lines appended to a file
+    - serve_updates()    - lines sent to a local socket
+Each record is one line of JSON, {"path": [0, 1, 3, 4], "reached_goal": true},
+or just the node ids "0 1 3 4". reached_goal is optional; without it a path
+counts as reaching the goal if it visited the goal, same as
+update_node_probabilities. Records with a transition that isn't an edge of
+the network are skipped.
+
+run() takes records off the queue in micro-batches (up to batch_size at a
+time, waiting up to batch_delay seconds for more) and applies each batch
+with update_from_walks in one go.
+
+The queue holds at most max_queue records. Once it's full, put() waits and
+the file and socket sources stop reading until run() catches up, so a fast
+producer can't use up all the memory.
+
+Readers get the current probabilities from get_probabilities() or from
+serve_readers() (send a node id, get back a line of JSON). Everything runs on
+one event loop and a batch is applied without any awaits in the middle, so a
+reader always sees the probabilities from before or after a whole batch,
+never part way through one.
+
+Usage:
+    service = StreamingTrainer(network, batch_size=500)
+    await asyncio.gather(service.run(),
+                         service.serve_updates("127.0.0.1", 8700),
+                         service.serve_readers("127.0.0.1", 8701))
+"""
+class StreamingTrainer(object):
+
+    # put on the queue by stop(), tells run() to finish
+    STOP = None
+
+    def __init__(self, network, max_queue=10000, batch_size=1000, batch_delay=0.05):
+        self.network = network  # a Network or CSRNetwork
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay  # seconds to wait for a batch to fill up
+
+        self.records_applied = 0
+        self.records_rejected = 0
+        self.batches_applied = 0
+
+    """
+    Adds one path (a list of node ids) to the queue, waiting if it's full.
+    """
+    async def put(self, path, reached_goal=None):
+        await self.queue.put((list(path), reached_goal))
+
+    """
+    Tells run() to apply what's left on the queue and then finish.
+    """
+    async def stop(self):
+        await self.queue.put(self.STOP)
+
+    """
+    Turns one line of input into (path, reached_goal), or None if it's blank.
+    """
+    @staticmethod
+    def parse_record(line):
+
+        line = line.strip()
+        if not line:
+            return None
+
+        if line.startswith("{"):
+            record = json.loads(line)
+            return [int(node_id) for node_id in record["path"]], record.get("reached_goal")
+
+        return [int(node_id) for node_id in line.split()], None
+
+    """
+    Reads records line by line from an asyncio StreamReader into the queue.
+    """
+    async def read_stream(self, reader):
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            try:
+                record = self.parse_record(line.decode())
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Skipping unreadable record: %r", line)
+                self.records_rejected += 1
+                continue
+
+            if record is not None:
+                await self.queue.put(record)
+
+    """
+    Follows a file like tail -f, queueing each line added to it. Starts from
+    the end of the file unless from_start is set. Runs until cancelled.
+    """
+    async def tail_file(self, path, poll_interval=0.5, from_start=False):
+
+        with open(path) as record_file:
+            if not from_start:
+                record_file.seek(0, os.SEEK_END)
+
+            partial = ""
+            while True:
+                line = record_file.readline()
+                if not line:
+                    await asyncio.sleep(poll_interval)
+                    continue
+
+                # a line still being written, wait for the rest of it
+                partial += line
+                if not partial.endswith("\n"):
+                    continue
+                line, partial = partial, ""
+
+                try:
+                    record = self.parse_record(line)
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("Skipping unreadable record: %r", line)
+                    self.records_rejected += 1
+                    continue
+
+                if record is not None:
+                    await self.queue.put(record)
+
+    """
+    Accepts connections on a local socket and queues the records sent on
+    each one. Returns the asyncio server (use it with async with, or close it).
+    """
+    async def serve_updates(self, host="127.0.0.1", port=8700):
+
+        async def handle(reader, writer):
+            try:
+                await self.read_stream(reader)
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+    """
+    Accepts connections from readers. Each line sent should be a node id, and
+    gets back a line of JSON with that node's current probabilities.
+    Returns the asyncio server.
+    """
+    async def serve_readers(self, host="127.0.0.1", port=8701):
+
+        async def handle(reader, writer):
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        node_id = int(line)
+                        reply = {"node": node_id,
+                                 "probabilities": self.get_probabilities(node_id)}
+                    except (ValueError, KeyError, IndexError):
+                        reply = {"node": line.decode().strip(), "error": "unknown node"}
+
+                    writer.write((json.dumps(reply) + "\n").encode())
+                    await writer.drain()
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+    """
+    Current {neighbour_id: probability} of a node.
+    """
+    def get_probabilities(self, node_id):
+
+        network = self.network
+        if hasattr(network, "nodes"):
+            return dict(network.nodes[node_id].edges)
+
+        if not 0 <= node_id < network.num_nodes:
+            raise KeyError(node_id)
+        network.initialise_all_node_neighbours()
+        neighbour_ids, probabilities = network.get_row(node_id)
+        return dict(zip(neighbour_ids.tolist(), probabilities.tolist()))
+
+    """
+    Whether every transition along a path is an edge the network has. The
+    update rule only works for real edges: a missing one would take
+    probability from the rest of the row without giving it to anything.
+    """
+    def is_known_path(self, path):
+
+        network = self.network
+        if hasattr(network, "nodes"):
+            nodes = network.nodes
+            return all(node_id in nodes and neighbour_id in nodes[node_id].edges
+                       for node_id, neighbour_id in zip(path, path[1:]))
+
+        num_nodes = network.num_nodes
+        if not all(0 <= node_id < num_nodes for node_id in path):
+            return False
+        return bool((network.find_edges(path[:-1], path[1:]) >= 0).all())
+
+    """
+    Applies one batch of (path, reached_goal) records, skipping any that
+    aren't made of the network's edges. Nothing is awaited in here, so no reader can run until
+    the whole batch is in.
+    """
+    def apply_batch(self, records):
+
+        network = self.network
+        metrics = network.metrics
+        if metrics is not None:
+            clock = metrics.clock()
+
+        if not hasattr(network, "nodes"):
+            network.initialise_all_node_neighbours()
+
+        known = [record for record in records if record[0] and self.is_known_path(record[0])]
+        if len(known) < len(records):
+            logger.warning("Skipped %d records with unknown edges", len(records) - len(known))
+            self.records_rejected += len(records) - len(known)
+        records = known
+        if not records:
+            return
+
+        # pad the paths into rows of a walks array, like simulate_walks
+        longest = max(len(path) for path, _ in records)
+        walks = np.full((len(records), longest), -1, dtype=np.int64)
+        goal_reached = np.zeros(len(records), dtype=bool)
+        lengths = np.zeros(len(records), dtype=np.int64)
+        for i, (path, reached_goal) in enumerate(records):
+            walks[i, :len(path)] = path
+            lengths[i] = len(path) - 1
+            if reached_goal is None:
+                goal_reached[i] = len(path) > 1 and network.goal_node_id in path
+            else:
+                goal_reached[i] = reached_goal
+
+        network.update_from_walks(walks, goal_reached)
+
+        self.records_applied += len(records)
+        self.batches_applied += 1
+
+        if metrics is not None:
+            metrics.lap("updating", clock, "update_from_walks")
+            metrics.record_walks(walks, network.goal_node_id, lengths, goal_reached)
+
+    """
+    The ingestion loop: takes records off the queue in micro-batches and
+    applies them, until stop() is called.
+    """
+    async def run(self):
+
+        while True:
+            record = await self.queue.get()
+            if record is self.STOP:
+                return
+
+            batch = [record]
+            stopping = self.take_waiting(batch)
+
+            # give a small batch a moment to fill up
+            if not stopping and len(batch) < self.batch_size and self.batch_delay > 0:
+                await asyncio.sleep(self.batch_delay)
+                stopping = self.take_waiting(batch)
+
+            self.apply_batch(batch)
+            logger.debug("Applied batch of %d records (%d waiting)", len(batch),
+                         self.queue.qsize())
+
+            if stopping:
+                return
+
+    """
+    Moves records already waiting on the queue into batch, up to batch_size.
+    Returns True if the stop marker was reached.
+    """
+    def take_waiting(self, batch):
+
+        while len(batch) < self.batch_size:
+            try:
+                record = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return False
+            if record is self.STOP:
+                return True
+            batch.append(record)
+
+        return False
+
+
+if __name__ == "__main__":
+
+    from csr_network import CSRNetwork
+
+    network = CSRNetwork(training_tests=100,
+                         path_length=10,
+                         reinforcement=0.01
+                         )
+    network.construct_graph_example_2(num_nodes=20, goal_node=12)
+    network.initialise_all_node_neighbours()
+
+    async def main():
+        service = StreamingTrainer(network, batch_size=100)
+        trainer = asyncio.ensure_future(service.run())
+
+        # another part of the program reporting paths it saw
+        for walk in network.simulate_walks(1000, network.path_length):
+            await service.put([node_id for node_id in walk.tolist() if node_id >= 0])
+        await service.stop()
+        await trainer
+
+        print("Applied {} records in {} batches".format(service.records_applied,
+                                                        service.batches_applied))
+        print("Node 0:", service.get_probabilities(0))
+
+    asyncio.run(main())
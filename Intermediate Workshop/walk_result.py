@@ -0,0 +1,31 @@
+"""
+What happened on one walk through the network, worked out while walking so
+nothing has to go back over the path afterwards:
+    path         - list of (current_node, next_node) transitions
+    visited      - set of the node ids on the path (empty if it never moved)
+    reached_goal - whether the walk ended on the goal
+    ended        - why the walk stopped, one of the reasons below
+"""
+class WalkResult(object):
+
+    __slots__ = ("path", "visited", "reached_goal", "ended")
+
+    # reasons a walk ends
+    GOAL = "goal"                    # reached the goal
+    OUT_OF_MOVES = "out_of_moves"    # used up the path length
+    NO_NEIGHBOURS = "no_neighbours"  # on a node with no edges
+    HOPELESS = "hopeless"            # goal further away than the moves left
+    STUCK = "stuck"                  # the choice fell past the last edge, or
+                                     # the chosen neighbour isn't in the network
+
+    def __init__(self, path, visited, ended):
+        self.path = path
+        self.visited = visited
+        self.reached_goal = ended == self.GOAL
+        self.ended = ended
+
+    def __len__(self):
+        return len(self.path)
+
+    def __str__(self):
+        return "Walk of {} steps ({}): {}".format(len(self.path), self.ended, self.path)